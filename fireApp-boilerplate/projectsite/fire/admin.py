@@ -1,10 +1,116 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import Incident, Locations, Firefighters, FireStation, FireTruck, WeatherConditions
+from fire import search
+from fire.pagination import ApproximateCountPaginator
+from .models import Incident, Locations, Firefighters, FireStation, FireTruck, WeatherConditions, SlowQuery
 
-admin.site.register(Incident)
-admin.site.register(Locations)
-admin.site.register(Firefighters)
-admin.site.register(FireStation)
-admin.site.register(FireTruck)
-admin.site.register(WeatherConditions)
+# Full-text matches the incident search box looks through: all of the
+# candidates search() ranks, which are the newest matches
+INCIDENT_SEARCH_LIMIT = search.MAX_CANDIDATES
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for tables that grow to millions of rows: counts
+    come from ApproximateCountPaginator, and a filtered list does not also
+    count the whole table for its "N total" link.
+    """
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+# Search fields use ^ (prefix match), which can stop early along an index
+# rather than testing every row for a substring.
+
+@admin.register(Locations)
+class LocationsAdmin(LargeTableAdmin):
+    list_display = ("name", "address", "city", "country")
+    list_filter = ("country",)
+    search_fields = ("^name", "^city")
+    readonly_fields = ("geohash",)
+    ordering = ("name",)
+
+
+# list_filter fields are indexed first, ahead of the changelist ordering
+# (Incident: severity_level, date_time, id; Firefighters: experience_level, id).
+
+@admin.register(Incident)
+class IncidentAdmin(LargeTableAdmin):
+    list_display = ("id", "date_time", "severity_level", "location", "description")
+    list_select_related = ("location",)
+    list_filter = ("severity_level",)
+    date_hierarchy = "date_time"
+    search_fields = ("description",)
+    autocomplete_fields = ("location",)
+    ordering = ("-date_time", "-id")
+
+    def get_queryset(self, request):
+        # Incident.__str__ reads the location; the incident autocomplete
+        # renders labels from this queryset
+        return super().get_queryset(request).select_related("location")
+
+    def get_search_results(self, request, queryset, search_term):
+        # Looked up in the full-text index (fire/search.py) instead of a
+        # LIKE '%term%' scan over description
+        if not search.terms(search_term):
+            return queryset, False
+        matches = search.search(search_term, INCIDENT_SEARCH_LIMIT)
+        if len(matches) == INCIDENT_SEARCH_LIMIT and request.resolver_match.url_name.endswith('_changelist'):
+            self.message_user(
+                request,
+                f"Only the newest {INCIDENT_SEARCH_LIMIT} incidents matching \"{search_term}\" are listed. "
+                "Add words to narrow the search.",
+                messages.WARNING)
+        return queryset.filter(pk__in=[pk for pk, score in matches]), False
+
+
+@admin.register(FireStation)
+class FireStationAdmin(LargeTableAdmin):
+    list_display = ("name", "address", "city", "country")
+    search_fields = ("^name", "^city")
+    readonly_fields = ("geohash",)
+    ordering = ("name",)
+
+
+@admin.register(Firefighters)
+class FirefightersAdmin(LargeTableAdmin):
+    list_display = ("name", "rank", "experience_level", "station")
+    list_select_related = ("station",)
+    list_filter = ("experience_level",)
+    search_fields = ("^name",)
+    autocomplete_fields = ("station",)
+
+
+@admin.register(FireTruck)
+class FireTruckAdmin(LargeTableAdmin):
+    list_display = ("truck_number", "model", "capacity", "station")
+    list_select_related = ("station",)
+    search_fields = ("^truck_number",)
+    autocomplete_fields = ("station",)
+
+
+@admin.register(WeatherConditions)
+class WeatherConditionsAdmin(LargeTableAdmin):
+    list_display = ("incident", "temperature", "humidity", "wind_speed", "weather_description")
+    list_select_related = ("incident__location",)
+    autocomplete_fields = ("incident",)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ("recorded_at", "duration_ms", "view", "database", "full_scan", "short_sql")
+    list_filter = ("full_scan", "database", "view")
+    search_fields = ("sql", "plan")
+    ordering = ("-recorded_at",)
+    readonly_fields = ("recorded_at", "database", "view", "duration_ms", "full_scan", "sql", "params", "plan")
+
+    @admin.display(description="SQL")
+    def short_sql(self, obj):
+        return obj.sql[:120]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+
+# Threads for read-only calls that run side by side. Each keeps its own
+# connection, persistent under CONN_MAX_AGE like a request thread's.
+READ_THREADS = 4
+read_executor = ThreadPoolExecutor(max_workers=READ_THREADS, thread_name_prefix='fire-read')
+
+
+def run_all(calls):
+    return [func(*args) for func, *args in calls]
+
+
+def in_transaction():
+    return connection.in_atomic_block
+
+
+def run_on_read_thread(func, *args):
+    # What Django does around a request: connections past CONN_MAX_AGE, or
+    # found broken, are closed before and after
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(*calls):
+    """
+    Run blocking calls, given as ``(func, *args)`` tuples, and return their
+    results in order.
+
+    They run one after another in a single thread-sensitive hop, on the
+    request's own connection, so Django keeps managing it: persistent
+    connections (CONN_MAX_AGE) are reused and uncommitted rows are visible.
+    The event loop stays free while they run.
+    """
+    return await sync_to_async(run_all, thread_sensitive=True)(calls)
+
+
+async def run_concurrently(*calls):
+    """
+    Like run_sync(), but for independent read-only calls: they run at the
+    same time on the read threads, each on that thread's connection, and
+    the routing hints of the request go with them.
+
+    Inside a transaction on the request's connection (ATOMIC_REQUESTS, or a
+    test) other connections cannot see its rows, so the calls fall back to
+    run_sync().
+    """
+    if len(calls) < 2 or await sync_to_async(in_transaction, thread_sensitive=True)():
+        return await run_sync(*calls)
+    return await asyncio.gather(*(
+        sync_to_async(run_on_read_thread, thread_sensitive=False, executor=read_executor)(func, *args)
+        for func, *args in calls))
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FireConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "fire"
+
+    def ready(self):
+        from fire import signals  # noqa: F401
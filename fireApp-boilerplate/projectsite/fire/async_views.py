@@ -0,0 +1,115 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, quote_etag
+
+from fire import aio, charts, clustering, geojson, live
+from fire.compression import compress_response
+from fire.models import Incident, FireStation
+from fire.routers import read_from_replica
+from fire.views import incident_cities
+
+# Async counterparts of the chart and map views, served instead of the sync
+# ones when FIRE_ASYNC_VIEWS is set (projectsite/asgi.py sets it). Blocking
+# ORM work runs through thread-sensitive sync_to_async, so Django manages
+# the connections as it does for sync views, except for the independent
+# reads of one request (the dashboard series, the cluster tiles), which
+# aio.run_concurrently() runs side by side on connections of their own.
+
+# === JSON CHART VIEWS ===
+
+@read_from_replica
+async def PieCountbySeverity(request):
+    return JsonResponse(await sync_to_async(charts.severity_counts)())
+
+@read_from_replica
+async def LineCountbyMonth(request):
+    return JsonResponse(await sync_to_async(charts.monthly_counts)())
+
+@read_from_replica
+async def MultilineIncidentTop3Country(request):
+    return JsonResponse(await sync_to_async(charts.top3_country_monthly_counts)())
+
+@read_from_replica
+async def multipleBarbySeverity(request):
+    return JsonResponse(await sync_to_async(charts.severity_monthly_counts)())
+
+@compress_response
+@read_from_replica
+async def dashboard_data(request):
+    # @condition only wraps sync views, so the ETag check is done here
+    etag = quote_etag(await charts.adashboard_etag(request))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        pie, line, multiline, multi_bar = await aio.run_concurrently(
+            (charts.severity_counts,),
+            (charts.monthly_counts,),
+            (charts.top3_country_monthly_counts,),
+            (charts.severity_monthly_counts,),
+        )
+        response = JsonResponse({'pie': pie, 'line': line, 'multiline': multiline, 'multiBar': multi_bar})
+    if request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+    return response
+
+# === MAP VIEWS ===
+
+@read_from_replica
+async def map_station(request):
+    return await sync_to_async(render)(request, 'map_station.html')
+
+@read_from_replica
+async def map_incidents(request):
+    cities = await sync_to_async(incident_cities)()
+    return await sync_to_async(render)(request, 'map_incidents.html', {'cities': cities, 'live_stream': settings.FIRE_ASYNC_VIEWS})
+
+# === GEOJSON API ===
+
+@read_from_replica
+async def incidents_geojson(request):
+    try:
+        incidents = geojson.filter_incidents(Incident.objects.all(), request.GET)
+    except geojson.FilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    rows = geojson.incident_rows(incidents).aiterator(chunk_size=geojson.CHUNK_SIZE)
+    return StreamingHttpResponse(
+        geojson.afeature_collection(rows, geojson.incident_feature),
+        content_type='application/geo+json')
+
+@read_from_replica
+async def incident_clusters(request):
+    try:
+        zoom = int(request.GET.get('zoom', ''))
+    except ValueError:
+        return JsonResponse({'error': 'zoom must be an integer'}, status=400)
+    try:
+        tiles = await sync_to_async(clustering.cluster_tiles)(zoom, request.GET)
+    except geojson.FilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    # Each tile is its own cached query, so the tiles are read side by side
+    per_tile = await aio.run_concurrently(*[(clustering.tile_clusters, *tile) for tile in tiles])
+    return JsonResponse({'zoom': zoom, 'clusters': [cluster for result in per_tile for cluster in result]})
+
+@read_from_replica
+async def stations_geojson(request):
+    try:
+        stations = geojson.filter_bbox(FireStation.objects.all(), request.GET)
+    except geojson.FilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    rows = geojson.station_rows(stations).aiterator(chunk_size=geojson.CHUNK_SIZE)
+    return StreamingHttpResponse(
+        geojson.afeature_collection(rows, geojson.station_feature),
+        content_type='application/geo+json')
+
+# === LIVE FEED ===
+
+async def incident_feed(request):
+    # Server-Sent Events: changed incidents and chart deltas. ?charts=0
+    # leaves the chart events out (the map page does not draw them).
+    feed = await sync_to_async(live.IncidentFeed)(
+        request.headers.get('Last-Event-ID'), charts=request.GET.get('charts') != '0')
+    response = StreamingHttpResponse(live.aevent_stream(feed), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
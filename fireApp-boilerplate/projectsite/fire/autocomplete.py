@@ -0,0 +1,88 @@
+from django.core.cache import caches
+from django.db.models import Q
+
+from fire import search
+from fire.cache import CACHE_ALIAS, KEY_PREFIX, model_versions
+from fire.models import FireStation, Incident, Locations
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+LABEL_TIMEOUT = 24 * 3600
+
+
+class Source:
+    """
+    Options for one foreign key's autocomplete widget. Labels are built from
+    ``values()`` rows, not ``__str__``, so a page of options is one query,
+    and are cached under the versions of the models they are read from.
+    """
+
+    def __init__(self, name, model, fields, label, search_fields=(), ordering=('pk',), models=()):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.label = label
+        self.search_fields = search_fields
+        self.ordering = ordering
+        self.models = (model, *models)
+
+    def label_key(self, pk, versions):
+        return f"{KEY_PREFIX}:autocomplete:{self.name}:{pk}:{versions}"
+
+    def rows(self, queryset):
+        return {row['pk']: self.label.format(**row) for row in queryset.values('pk', *self.fields)}
+
+    def matches(self, query, limit):
+        # [pk] of the first ``limit`` options whose search fields start with ``query``
+        queryset = self.model.objects.order_by(*self.ordering)
+        if query:
+            prefix = Q()
+            for field in self.search_fields:
+                prefix |= Q(**{f'{field}__istartswith': query})
+            queryset = queryset.filter(prefix)
+        return list(queryset.values_list('pk', flat=True)[:limit])
+
+    def options(self, query, limit):
+        """
+        ([(pk, label)], more) for the options matching ``query``; the labels
+        found are cached for the widget's next render.
+        """
+        pks = self.matches(query.strip(), limit + 1)
+        more = len(pks) > limit
+        pks = pks[:limit]
+        labels = self.labels(pks)
+        return [(pk, labels[pk]) for pk in pks if pk in labels], more
+
+    def labels(self, pks):
+        # {pk: label}, from the cache where possible and one query otherwise
+        if not pks:
+            return {}
+        cache = caches[CACHE_ALIAS]
+        versions = '.'.join(str(v) for v in model_versions(*self.models))
+        keys = {self.label_key(pk, versions): pk for pk in pks}
+        labels = {keys[key]: label for key, label in cache.get_many(keys).items()}
+        missing = [pk for pk in pks if pk not in labels]
+        if missing:
+            found = self.rows(self.model.objects.filter(pk__in=missing))
+            cache.set_many({self.label_key(pk, versions): label for pk, label in found.items()}, LABEL_TIMEOUT)
+            labels.update(found)
+        return labels
+
+
+class IncidentSource(Source):
+    # Incidents are found through the full-text index, which already
+    # matches word prefixes in the description and location
+    def matches(self, query, limit):
+        if not search.terms(query):
+            return list(self.model.objects.order_by('-id').values_list('pk', flat=True)[:limit])
+        return [pk for pk, score in search.search(query, limit)]
+
+
+SOURCES = {source.name: source for source in (
+    Source('locations', Locations, ('name', 'address', 'city', 'country'),
+           '{name} - {address}, {city}, {country}', search_fields=('name', 'city'), ordering=('name', 'pk')),
+    Source('stations', FireStation, ('name', 'city', 'country'),
+           '{name} - {city}, {country}', search_fields=('name', 'city'), ordering=('name', 'pk')),
+    IncidentSource('incidents', Incident, ('severity_level', 'location__name', 'date_time'),
+                   '{severity_level} at {location__name} on {date_time}', models=(Locations,)),
+)}
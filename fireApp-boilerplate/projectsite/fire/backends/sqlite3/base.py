@@ -0,0 +1,79 @@
+"""
+SQLite backend for the production DB profile (FIRE_DB_PROFILE=production).
+
+On top of Django's backend it:
+
+* applies PRAGMAs (WAL journal, synchronous=NORMAL, mmap/cache sizes) to
+  every new connection; override them with OPTIONS["pragmas"];
+* opens transactions with BEGIN IMMEDIATE, so a writer waits for the lock
+  under the busy timeout instead of failing on a read->write upgrade;
+* retries statements that still hit "database is locked" when retrying
+  is safe, i.e. outside an atomic block or when starting one, with
+  exponential backoff, OPTIONS["write_retries"] times.
+"""
+import random
+import re
+import sqlite3
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative: KiB rather than pages
+    "temp_store": "MEMORY",
+}
+RETRY_BACKOFF = 0.05  # seconds, doubled on every attempt
+
+
+def is_locked(error):
+    return "database is locked" in str(error) or "database table is locked" in str(error)
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    def execute(self, query, params=None):
+        return self.db.retry_locked(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self.db.retry_locked(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **params.pop("pragmas", {})}
+        for name in self.pragmas:
+            if not re.fullmatch(r"\w+", name):
+                raise ImproperlyConfigured(f"Invalid SQLite pragma name {name!r}")
+        self.write_retries = params.pop("write_retries", 5)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.db = self
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
+
+    def retry_locked(self, func, *args):
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as e:
+                # Inside an atomic block earlier statements of the same
+                # transaction may be lost, so only the caller can retry.
+                if not is_locked(e) or self.in_atomic_block or attempt >= self.write_retries:
+                    raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
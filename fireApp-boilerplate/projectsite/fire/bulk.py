@@ -0,0 +1,220 @@
+import hashlib
+from collections import Counter
+from datetime import timedelta
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from fire import rollups, rosters, search
+from fire.cache import bump_version_on_commit
+from fire.forms import IncidentForm, FirefightersForm, FireTruckForm
+from fire.models import Incident, IdempotencyKey
+
+BULK_FORMS = {form._meta.model._meta.model_name: form for form in (IncidentForm, FireTruckForm, FirefightersForm)}
+MAX_ITEMS = 1000
+BATCH_SIZE = 500
+
+
+class BatchError(ValueError):
+    pass
+
+
+class KeyReused(ValueError):
+    pass
+
+
+def parse_items(payload):
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise BatchError('expected {"items": [{...}, ...]}')
+    if not items:
+        raise BatchError("no items")
+    if len(items) > MAX_ITEMS:
+        raise BatchError(f"at most {MAX_ITEMS} items per batch")
+    # Every item is validated against the row as it was before the batch,
+    # so two items for one row would overwrite each other's changes
+    repeated = sorted(pk for pk, n in Counter(item_id(item) for item in items).items() if pk is not None and n > 1)
+    if repeated:
+        raise BatchError(f"ids {repeated} appear more than once; send one item per row")
+    return items
+
+
+def item_id(item):
+    if item.get('id') in (None, ''):
+        return None
+    try:
+        return int(item['id'])
+    except (TypeError, ValueError):
+        raise BatchError(f"invalid id {item['id']!r}")
+
+
+def use_prefetched(field, objects):
+    # Resolve the field's choices from ``objects``, fetched once for the
+    # whole batch, rather than with one query per item
+    def to_python(value):
+        if value in field.empty_values:
+            return None
+        try:
+            return objects[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(field.error_messages['invalid_choice'], code='invalid_choice',
+                                  params={'value': value})
+    field.to_python = to_python
+
+
+def batch_form(form_class, related):
+    class BatchForm(form_class):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            for name, objects in related.items():
+                use_prefetched(self.fields[name], objects)
+
+        def _get_validation_exclusions(self):
+            # The foreign keys are already checked against the prefetched
+            # rows; model validation would check each one again with a query
+            return super()._get_validation_exclusions() | set(related)
+
+    return BatchForm
+
+
+def validate(form_class, items):
+    """
+    A bound form per item, validated with the model's ModelForm. Items with
+    an ``id`` update that row; omitted fields keep their current values.
+    """
+    model = form_class._meta.model
+    ids = [item_id(item) for item in items]
+    queryset = model.objects.select_related('location') if model is Incident else model.objects.all()
+    existing = queryset.in_bulk([pk for pk in ids if pk is not None])
+    # What the updated rows count for now: their incident rollup bucket, or
+    # what they add to their station's roster
+    counted = rollups.rollup_key if model is Incident else rosters.contribution
+    previous = {pk: counted(instance) for pk, instance in existing.items()}
+
+    data = []
+    for pk, item in zip(ids, items):
+        instance = existing.get(pk)
+        values = model_to_dict(instance) if instance is not None else {}
+        values.update({name: value for name, value in item.items() if name != 'id'})
+        data.append((pk, instance, values))
+
+    # Every foreign key the batch refers to, one query per field
+    related = {}
+    for name, field in form_class.base_fields.items():
+        if isinstance(field, forms.ModelChoiceField):
+            wanted = set()
+            for pk, instance, values in data:
+                try:
+                    wanted.add(int(values.get(name)))
+                except (TypeError, ValueError):
+                    pass
+            related[name] = field.queryset.model.objects.in_bulk(wanted)
+
+    form_class = batch_form(form_class, related)
+    bound = []
+    for pk, instance, values in data:
+        form = form_class(data=values, instance=instance)
+        if pk is not None and instance is None:
+            form.add_error(None, f"{model._meta.model_name} {pk} does not exist")
+        bound.append(form)
+    return bound, previous
+
+
+def write(form_class, bound, previous):
+    # Save the validated forms: one bulk_create and one bulk_update
+    model = form_class._meta.model
+    now = timezone.now()
+    created, updated = [], []
+    for form in bound:
+        instance = form.save(commit=False)
+        if instance.pk is None:
+            created.append(instance)
+        else:
+            instance.updated_at = now
+            updated.append(instance)
+    fields = [field.name for field in model._meta.concrete_fields if field.name in form_class.base_fields]
+    model.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    model.objects.bulk_update(updated, [*fields, 'updated_at'], batch_size=BATCH_SIZE)
+
+    # bulk_create/bulk_update skip the save signals: what they maintain is
+    # kept up to date here
+    if model is Incident:
+        deltas = Counter()
+        for incident in created + updated:
+            old_key, new_key = previous.get(incident.pk), rollups.rollup_key(incident)
+            if old_key != new_key:
+                if old_key is not None:
+                    deltas[old_key] -= 1
+                deltas[new_key] += 1
+        rollups.apply_deltas(deltas)
+        search.index_incidents([incident.pk for incident in created + updated])
+    else:
+        rosters.move([(previous.get(instance.pk), rosters.contribution(instance)) for instance in created + updated])
+    bump_version_on_commit(model)
+    return [form.instance for form in bound], {instance.pk for instance in created}
+
+
+def request_hash(model_name, body):
+    return hashlib.sha256(model_name.encode() + b'\0' + body).hexdigest()
+
+
+def horizon():
+    return timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_HOURS)
+
+
+def prune_keys():
+    return IdempotencyKey.objects.filter(created_at__lt=horizon()).delete()[0]
+
+
+def replay(key, digest):
+    # (status, response) stored for ``key``, or None when it is new or expired
+    record = IdempotencyKey.objects.filter(key=key, created_at__gte=horizon()).first()
+    if record is None:
+        return None
+    if record.request_hash != digest:
+        raise KeyReused(f"Idempotency-Key {key!r} was already used for a different request")
+    return record.status, record.response
+
+
+def apply(model_name, items, key=None, digest=None):
+    """
+    (status, response) for a bulk write: every item is saved in one
+    transaction, or, if any item is invalid, none is and the errors are
+    returned per item. A successful response is stored under ``key``, so
+    the same request sent again is answered without writing twice.
+    """
+    form_class = BULK_FORMS[model_name]
+    if key:
+        stored = replay(key, digest)
+        if stored is not None:
+            return stored
+
+    try:
+        with transaction.atomic():
+            bound, previous = validate(form_class, items)
+            if not all([form.is_valid() for form in bound]):
+                return 400, {'results': [
+                    {'index': index, 'errors': form.errors.get_json_data()} if form.errors
+                    else {'index': index, 'status': 'valid'}
+                    for index, form in enumerate(bound)]}
+            instances, created = write(form_class, bound, previous)
+            response = {'results': [
+                {'index': index, 'id': instance.pk, 'status': 'created' if instance.pk in created else 'updated'}
+                for index, instance in enumerate(instances)]}
+            if key:
+                prune_keys()
+                IdempotencyKey.objects.create(
+                    key=key, model=model_name, request_hash=digest, status=200, response=response)
+    except IntegrityError:
+        if not key:
+            raise
+        # The same key was stored by a concurrent request; ours is rolled back
+        stored = replay(key, digest)
+        if stored is None:
+            raise
+        return stored
+    return 200, response
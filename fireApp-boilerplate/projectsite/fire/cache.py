@@ -0,0 +1,92 @@
+import functools
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from fire import routers
+
+CACHE_ALIAS = 'default'
+KEY_PREFIX = 'fire'
+
+
+def version_key(model):
+    return f"{KEY_PREFIX}:version:{model._meta.label_lower}"
+
+
+def changed_key(model):
+    return f"{KEY_PREFIX}:changed:{model._meta.label_lower}"
+
+
+def model_versions(*models):
+    cache = caches[CACHE_ALIAS]
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # A fresh, time-based version never collides with entries written
+        # under a version that has since been evicted.
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    cache = caches[CACHE_ALIAS]
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+    # Expires once the replicas have had time to catch up with the change
+    cache.set(changed_key(model), True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def recently_changed(*models):
+    # Whether a replica may still be missing a change to any of ``models``
+    return bool(caches[CACHE_ALIAS].get_many([changed_key(model) for model in models]))
+
+
+def cacheable_reads(*models):
+    """
+    Routing for reads whose result is kept under the current versions of
+    ``models``. Until the replicas have had time to catch up with the last
+    change, the primary, as a lagging replica would store stale rows under
+    the new version; after that, the caller's routing hint.
+    """
+    return routers.primary() if recently_changed(*models) else nullcontext()
+
+
+def bump_version_on_commit(model):
+    # Bumping before commit would let another connection cache the old rows
+    # under the new version.
+    transaction.on_commit(lambda: bump_version(model))
+
+
+def versioned_cache(*models, timeout=None):
+    """
+    Memoize a function's result in the cache, keyed on its arguments and on
+    the current version of each model it reads. Saving or deleting any of
+    those models bumps its version (see fire/signals.py), so stale entries are
+    simply never read again.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            versions = '.'.join(str(v) for v in model_versions(*models))
+            key = f"{KEY_PREFIX}:{name}:{':'.join(str(arg) for arg in args)}:{versions}"
+            cache = caches[CACHE_ALIAS]
+            result = cache.get(key)
+            if result is None:
+                with cacheable_reads(*models):
+                    result = func(*args)
+                cache.set(key, result, timeout)
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
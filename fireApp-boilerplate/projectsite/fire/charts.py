@@ -0,0 +1,127 @@
+from datetime import date, datetime
+
+from django.db.models import Max, Sum
+from django.db.models.functions import ExtractMonth
+
+from fire.cache import versioned_cache
+from fire.models import Incident, Locations, IncidentDailyRollup
+
+MONTH_NAMES = {1:'Jan',2:'Feb',3:'Mar',4:'Apr',5:'May',6:'Jun',7:'Jul',8:'Aug',9:'Sep',10:'Oct',11:'Nov',12:'Dec'}
+
+
+def year_range(year):
+    # A plain range keeps the day index usable on every backend
+    return {'day__gte': date(year, 1, 1), 'day__lt': date(year + 1, 1, 1)}
+
+
+@versioned_cache(Incident, Locations)
+def severity_counts():
+    rows = (IncidentDailyRollup.objects
+            .values('severity_level')
+            .annotate(count=Sum('count'))
+            .filter(count__gt=0)
+            .order_by())
+    return {row['severity_level']: row['count'] for row in rows}
+
+
+def monthly_counts():
+    return monthly_counts_for_year(datetime.now().year)
+
+
+@versioned_cache(Incident, Locations)
+def monthly_counts_for_year(current_year):
+    result = {month: 0 for month in range(1, 13)}
+    incidents_per_month = (IncidentDailyRollup.objects
+                           .filter(**year_range(current_year))
+                           .annotate(month=ExtractMonth('day'))
+                           .values('month')
+                           .annotate(count=Sum('count'))
+                           .order_by())
+    for row in incidents_per_month:
+        result[row['month']] = row['count']
+    return {MONTH_NAMES[k]: v for k, v in result.items()}
+
+
+def top3_country_monthly_counts():
+    return top3_country_monthly_counts_for_year(datetime.now().year)
+
+
+@versioned_cache(Incident, Locations)
+def top3_country_monthly_counts_for_year(year):
+    this_year = IncidentDailyRollup.objects.filter(**year_range(year))
+    top_countries = list(this_year
+                         .values('country')
+                         .annotate(count=Sum('count'))
+                         .filter(count__gt=0)
+                         .order_by('-count')
+                         .values_list('country', flat=True)[:3])
+    rows = (this_year
+            .filter(country__in=top_countries)
+            .annotate(month=ExtractMonth('day'))
+            .values_list('country', 'month')
+            .annotate(count=Sum('count'))
+            .order_by('country', 'month'))
+
+    result = {}
+    months = set(str(i).zfill(2) for i in range(1, 13))
+    for country, month, count in rows:
+        result.setdefault(country, {m: 0 for m in months})[str(month).zfill(2)] = count
+    while len(result) < 3:
+        result[f"Country {len(result)+1}"] = {m: 0 for m in months}
+    for country in result:
+        result[country] = dict(sorted(result[country].items()))
+    return result
+
+
+@versioned_cache(Incident, Locations)
+def severity_monthly_counts():
+    rows = (IncidentDailyRollup.objects
+            .filter(day__isnull=False)
+            .annotate(month=ExtractMonth('day'))
+            .values_list('severity_level', 'month')
+            .annotate(count=Sum('count'))
+            .order_by())
+
+    result = {}
+    months = set(str(i).zfill(2) for i in range(1, 13))
+    for level, month, count in rows:
+        result.setdefault(str(level), {m: 0 for m in months})[str(month).zfill(2)] = count
+    for level in result:
+        result[level] = dict(sorted(result[level].items()))
+    return result
+
+
+def dashboard_data():
+    return {
+        'pie': severity_counts(),
+        'line': monthly_counts(),
+        'multiline': top3_country_monthly_counts(),
+        'multiBar': severity_monthly_counts(),
+    }
+
+
+def etag_from(latest_incident, latest_location, total):
+    return '-'.join([
+        latest_incident.isoformat() if latest_incident else '0',
+        latest_location.isoformat() if latest_location else '0',
+        str(total or 0),
+    ])
+
+
+def dashboard_etag(request):
+    # Latest incident/location change plus the rollup total, so deletes and
+    # location moves also change the tag. All three read an index or the
+    # small rollup table, never a full incident scan.
+    return etag_from(
+        Incident.objects.aggregate(latest=Max('updated_at'))['latest'],
+        Locations.objects.aggregate(latest=Max('updated_at'))['latest'],
+        IncidentDailyRollup.objects.aggregate(total=Sum('count'))['total'],
+    )
+
+
+async def adashboard_etag(request):
+    return etag_from(
+        (await Incident.objects.aaggregate(latest=Max('updated_at')))['latest'],
+        (await Locations.objects.aaggregate(latest=Max('updated_at')))['latest'],
+        (await IncidentDailyRollup.objects.aaggregate(total=Sum('count')))['total'],
+    )
@@ -0,0 +1,115 @@
+import math
+
+from django.db.models import Count, F
+from django.http import QueryDict
+from django.utils.http import urlencode
+
+from fire import geojson
+from fire.cache import versioned_cache
+from fire.models import Incident, Locations
+
+TILE_SIZE = 256
+CELL_SIZE = 64  # pixels, so each tile is split into a 4x4 grid
+MAX_ZOOM = 18
+MAX_TILES = 64
+MAX_LATITUDE = 85.05112878  # Web Mercator cut-off
+
+
+def clamp_latitude(lat):
+    return max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+
+
+def to_pixel(lon, lat, zoom):
+    # Global Web Mercator pixel coordinates at the given zoom
+    scale = TILE_SIZE * 2 ** zoom
+    sin_lat = math.sin(math.radians(clamp_latitude(lat)))
+    x = (lon + 180.0) / 360.0 * scale
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def to_lonlat(x, y, zoom):
+    scale = TILE_SIZE * 2 ** zoom
+    lon = x / scale * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / scale))))
+    return lon, lat
+
+
+def tile_bounds(zoom, x, y):
+    min_lon, max_lat = to_lonlat(x * TILE_SIZE, y * TILE_SIZE, zoom)
+    max_lon, min_lat = to_lonlat((x + 1) * TILE_SIZE, (y + 1) * TILE_SIZE, zoom)
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def tiles_for_bbox(zoom, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    last = 2 ** zoom - 1
+    x0, y0 = to_pixel(max(min_lon, -180.0), max_lat, zoom)
+    x1, y1 = to_pixel(min(max_lon, 180.0), min_lat, zoom)
+    xs = range(max(0, int(x0 // TILE_SIZE)), min(last, int(x1 // TILE_SIZE)) + 1)
+    ys = range(max(0, int(y0 // TILE_SIZE)), min(last, int(y1 // TILE_SIZE)) + 1)
+    if len(xs) * len(ys) > MAX_TILES:
+        raise geojson.FilterError("bbox covers too many tiles for this zoom")
+    return [(x, y) for x in xs for y in ys]
+
+
+@versioned_cache(Incident, Locations)
+def tile_clusters(zoom, x, y, filters):
+    """
+    Grid clusters for one map tile. Incidents are first counted per
+    location and severity in the database, so the Python binning only sees
+    one row per distinct location. ``filters`` is the url-encoded non-bbox
+    filter set, which makes it part of the cache key.
+    """
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(zoom, x, y)
+    incidents = geojson.filter_incidents(Incident.objects.all(), QueryDict(filters))
+    # Half-open on the east/south edges so a point on a tile border is
+    # counted by exactly one tile.
+    incidents = incidents.filter(
+        location__longitude__gte=min_lon, location__longitude__lt=max_lon,
+        location__latitude__gt=min_lat, location__latitude__lte=max_lat,
+    )
+    rows = (incidents
+            .values('severity_level',
+                    latitude=F('location__latitude'),
+                    longitude=F('location__longitude'))
+            .annotate(n=Count('id'))
+            .order_by())
+
+    cells = {}
+    for row in rows:
+        lat, lon = float(row['latitude']), float(row['longitude'])
+        px, py = to_pixel(lon, lat, zoom)
+        key = (int(px // CELL_SIZE), int(py // CELL_SIZE))
+        cell = cells.setdefault(key, {'count': 0, 'lat': 0.0, 'lon': 0.0, 'severity': {}})
+        cell['count'] += row['n']
+        cell['lat'] += lat * row['n']
+        cell['lon'] += lon * row['n']
+        cell['severity'][row['severity_level']] = cell['severity'].get(row['severity_level'], 0) + row['n']
+
+    return [{
+        'latitude': cell['lat'] / cell['count'],
+        'longitude': cell['lon'] / cell['count'],
+        'count': cell['count'],
+        'severity': cell['severity'],
+    } for cell in cells.values()]
+
+
+def cluster_tiles(zoom, params):
+    # [(zoom, x, y, filters)] tile_clusters() arguments covering the request
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise geojson.FilterError(f"zoom must be between 0 and {MAX_ZOOM}")
+    bbox = geojson.parse_bbox(params.get('bbox') or f'-180,{-MAX_LATITUDE},180,{MAX_LATITUDE}')
+    filters = urlencode(sorted(
+        (key, value) for key, values in params.lists()
+        if key not in ('bbox', 'zoom') for value in values))
+    # Validate once up front rather than inside every cached tile
+    geojson.filter_incidents(Incident.objects.none(), QueryDict(filters))
+    return [(zoom, x, y, filters) for x, y in tiles_for_bbox(zoom, bbox)]
+
+
+def clusters(zoom, params):
+    result = []
+    for tile in cluster_tiles(zoom, params):
+        result.extend(tile_clusters(*tile))
+    return result
@@ -0,0 +1,54 @@
+import functools
+
+from asgiref.sync import iscoroutinefunction
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import decorator_from_middleware
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # optional: fall back to gzip only
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that prefers brotli when the ``brotli`` package is
+    installed and the client accepts ``br``.
+    """
+
+    def process_response(self, request, response):
+        if (brotli is None
+                or response.streaming
+                or len(response.content) < 200
+                or response.has_header("Content-Encoding")
+                or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+def compress_response(view):
+    if iscoroutinefunction(view):
+        # decorator_from_middleware only wraps sync views on this Django
+        compressor = CompressionMiddleware(view)
+
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            response = await view(request, *args, **kwargs)
+            return compressor.process_response(request, response)
+        return wrapper
+    return decorator_from_middleware(CompressionMiddleware)(view)
@@ -0,0 +1,90 @@
+import threading
+
+from fire import spatial
+from fire.cache import cacheable_reads, model_versions
+from fire.models import FireStation, Firefighters, FireTruck, StationRoster
+
+# Stations scored per incident, taken nearest first from the StationIndex
+CANDIDATES = 50
+DISTANCE_SCALE_KM = 10.0  # a station this far away gets half the distance score
+WEIGHTS = {'distance': 0.6, 'capacity': 0.25, 'crew': 0.15}
+# Water (liters) and crew a response to each severity should bring
+NEEDS = {
+    'Minor Fire': {'capacity': 1000, 'crew': 2},
+    'Moderate Fire': {'capacity': 3000, 'crew': 4},
+    'Major Fire': {'capacity': 8000, 'crew': 8},
+}
+# Experience levels scored 0..1 in the order Firefighters.XP_CHOICES lists them
+EXPERIENCE = {
+    level: i / (len(Firefighters.XP_CHOICES) - 1)
+    for i, (level, label) in enumerate(Firefighters.XP_CHOICES)
+}
+
+
+class ResourceSummary:
+    """
+    Trucks, water capacity, crew size and mean crew experience per station,
+    read from the station rosters in one query and held in memory until a
+    FireStation, FireTruck or Firefighters change moves the cache version.
+    """
+    _lock = threading.Lock()
+    _current = None
+
+    def __init__(self, stations, version=None):
+        self.version = version
+        self.stations = stations
+
+    @classmethod
+    def build(cls, version=None):
+        stations = {}
+        for roster in StationRoster.objects.iterator():
+            # Firefighters without an experience level count as the least experienced
+            experience = sum(EXPERIENCE[level] * n for level, n in roster.crew().items())
+            stations[roster.station_id] = {
+                'trucks': roster.trucks,
+                'capacity': float(roster.capacity),
+                'crew': roster.firefighters,
+                'experience': experience / roster.firefighters if roster.firefighters else 0.0,
+            }
+        return cls(stations, version)
+
+    @classmethod
+    def current(cls):
+        version = model_versions(FireStation, FireTruck, Firefighters)
+        summary = cls._current
+        if summary is None or summary.version != version:
+            with cls._lock:
+                summary = cls._current
+                if summary is None or summary.version != version:
+                    with cacheable_reads(FireStation, FireTruck, Firefighters):
+                        summary = cls._current = cls.build(version)
+        return summary
+
+    def get(self, station_id):
+        return self.stations.get(station_id)
+
+
+def score(distance_km, resources, needs):
+    distance = 1 / (1 + distance_km / DISTANCE_SCALE_KM)
+    capacity = min(1.0, resources['capacity'] / needs['capacity'])
+    crew = min(1.0, resources['crew'] / needs['crew']) * (0.5 + 0.5 * resources['experience'])
+    return (WEIGHTS['distance'] * distance
+            + WEIGHTS['capacity'] * capacity
+            + WEIGHTS['crew'] * crew)
+
+
+def recommend(latitude, longitude, severity_level, limit=5):
+    """
+    [(station_id, distance_km, resources, score)] best first. Distance is
+    great-circle distance standing in for travel distance; stations
+    without a truck are left out.
+    """
+    needs = NEEDS.get(severity_level, NEEDS['Moderate Fire'])
+    summary = ResourceSummary.current()
+    ranked = []
+    for station_id, distance in spatial.nearest_stations(latitude, longitude, CANDIDATES):
+        resources = summary.get(station_id)
+        if resources and resources['trucks']:
+            ranked.append((station_id, distance, resources, score(distance, resources, needs)))
+    ranked.sort(key=lambda item: item[3], reverse=True)
+    return ranked[:limit]
@@ -0,0 +1,105 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from fire import geojson
+from fire.models import Incident, WeatherConditions
+
+CHUNK_SIZE = 2000
+
+# Output column -> ORM path: the incident and its location...
+INCIDENT_FIELDS = {
+    'incident_id': 'id',
+    'date_time': 'date_time',
+    'severity_level': 'severity_level',
+    'description': 'description',
+    'location_id': 'location_id',
+    'location_name': 'location__name',
+    'address': 'location__address',
+    'city': 'location__city',
+    'country': 'location__country',
+    'latitude': 'location__latitude',
+    'longitude': 'location__longitude',
+}
+# ...and one of its weather readings
+WEATHER_FIELDS = {
+    'weather_id': 'id',
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'wind_speed': 'wind_speed',
+    'weather_description': 'weather_description',
+}
+EXPORT_FIELDS = {**INCIDENT_FIELDS, **WEATHER_FIELDS}
+
+
+def export_rows(params):
+    """
+    Incidents with their location and weather readings, as tuples in
+    EXPORT_FIELDS order: one row per reading, so an incident with several
+    readings is repeated and one without any has empty weather columns.
+    Accepts the same filters as the GeoJSON API (start, end, severity,
+    country, city, bbox).
+
+    Incidents (in id order) and readings (in incident_id, id order) are read
+    as two chunked iterators, each walking an index, and merged here, so
+    nothing has to sort the joined result and memory stays flat however
+    large the export is.
+    """
+    incidents = geojson.filter_incidents(Incident.objects.all(), params)
+    # Pick the database now: the rows are consumed while the response
+    # streams, after any routing hint has ended.
+    db = incidents.db
+    rows = (incidents
+            .using(db)
+            .order_by('id')
+            .values_list(*INCIDENT_FIELDS.values())
+            .iterator(chunk_size=CHUNK_SIZE))
+    readings = (WeatherConditions.objects
+                .using(db)
+                .filter(incident__in=incidents.values('id'))
+                .order_by('incident_id', 'id')
+                .values_list('incident_id', *WEATHER_FIELDS.values())
+                .iterator(chunk_size=CHUNK_SIZE))
+    return join_readings(rows, readings)
+
+
+def join_readings(rows, readings):
+    # Left-join two streams sorted by incident id: (incident_id, *reading)
+    # tuples onto incident rows whose first column is the id
+    no_reading = (None,) * len(WEATHER_FIELDS)
+    reading = next(readings, None)
+    for row in rows:
+        while reading is not None and reading[0] < row[0]:
+            reading = next(readings, None)
+        if reading is None or reading[0] != row[0]:
+            yield row + no_reading
+            continue
+        while reading is not None and reading[0] == row[0]:
+            yield row + reading[1:]
+            reading = next(readings, None)
+
+
+class Echo:
+    # File-like object whose write() hands the line back to csv.writer's caller
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS.keys())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    columns = list(EXPORT_FIELDS)
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
@@ -1,7 +1,35 @@
 from django.forms import ModelForm
 from django import forms
+from django.urls import reverse
+
+from fire.autocomplete import SOURCES
 from fire.models import Locations, Incident, FireStation, Firefighters, FireTruck, WeatherConditions
 
+
+class AutocompleteSelect(forms.Select):
+    """
+    A foreign key <select> holding only the current choice; other options
+    are fetched from the autocomplete API as the user types (see
+    static/js/autocomplete.js), so rendering never reads the whole table.
+    """
+
+    def __init__(self, source, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete'] = reverse('autocomplete', args=[self.source])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        pks = [int(v) for v in value if str(v).isdigit()]
+        labels = SOURCES[self.source].labels(pks)
+        choices = [('', '---------')] + [(pk, labels[pk]) for pk in pks if pk in labels]
+        return [(None, [self.create_option(name, choice, label, str(choice) in value, index)], index)
+                for index, (choice, label) in enumerate(choices)]
+
+
 class LocationsForm(ModelForm):
     class Meta:
         model = Locations
@@ -11,6 +39,7 @@ class IncidentForm(ModelForm):
     class Meta:
         model = Incident
         fields = "__all__"
+        widgets = {'location': AutocompleteSelect('locations')}
 
 class FireStationForm(ModelForm):
     class Meta:
@@ -26,13 +55,16 @@ class FirefightersForm(ModelForm):
     class Meta:
         model = Firefighters
         fields = "__all__"
+        widgets = {'station': AutocompleteSelect('stations')}
 
 class FireTruckForm(ModelForm):
     class Meta:
         model = FireTruck
         fields = "__all__"
+        widgets = {'station': AutocompleteSelect('stations')}
 
 class WeatherConditionsForm(ModelForm):
     class Meta:
         model = WeatherConditions
-        fields = "__all__" 
\ No newline at end of file
+        fields = "__all__"
+        widgets = {'incident': AutocompleteSelect('incidents')} 
\ No newline at end of file
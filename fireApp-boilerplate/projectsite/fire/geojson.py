@@ -0,0 +1,152 @@
+import json
+import math
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from fire.models import Incident, StationRoster
+
+CHUNK_SIZE = 2000
+ROSTER_FIELDS = ('trucks', 'capacity', 'firefighters', *StationRoster.LEVEL_FIELDS.values())
+
+
+class FilterError(ValueError):
+    pass
+
+
+def parse_bbox(value):
+    # "min_lon,min_lat,max_lon,max_lat", the GeoJSON/Leaflet toBBoxString() order
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(','))
+    except ValueError:
+        raise FilterError("bbox must be 'min_lon,min_lat,max_lon,max_lat'")
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        raise FilterError("bbox coordinates must be finite numbers")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise FilterError("bbox minimums must not exceed maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_moment(value, end=False):
+    # A bare date is tried first: parse_datetime() also reads it, as midnight,
+    # which would leave out the whole of an end day. Both parsers raise
+    # ValueError for well-formed dates that do not exist.
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else datetime.combine(day, time.max if end else time.min)
+    except ValueError:
+        raise FilterError(f"invalid date {value!r}")
+    if moment is None:
+        raise FilterError(f"invalid date {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_bbox(queryset, params, prefix=''):
+    if params.get('bbox'):
+        min_lon, min_lat, max_lon, max_lat = parse_bbox(params['bbox'])
+        queryset = queryset.filter(**{
+            f'{prefix}latitude__range': (min_lat, max_lat),
+            f'{prefix}longitude__range': (min_lon, max_lon),
+        })
+    return queryset
+
+
+def filter_incidents(queryset, params):
+    queryset = filter_bbox(queryset, params, prefix='location__')
+    if params.get('start'):
+        queryset = queryset.filter(date_time__gte=parse_moment(params['start']))
+    if params.get('end'):
+        queryset = queryset.filter(date_time__lte=parse_moment(params['end'], end=True))
+    if params.get('severity'):
+        levels = params['severity'].split(',')
+        valid = dict(Incident.SEVERITY_CHOICES)
+        unknown = [level for level in levels if level not in valid]
+        if unknown:
+            raise FilterError(f"unknown severity {unknown[0]!r}")
+        queryset = queryset.filter(severity_level__in=levels)
+    if params.get('city'):
+        queryset = queryset.filter(location__city=params['city'])
+    if params.get('country'):
+        queryset = queryset.filter(location__country=params['country'])
+    return queryset
+
+
+def incident_rows(incidents, *fields):
+    # Only the columns a feature needs, plus ``fields``. The database is
+    # picked now because the rows are consumed while the response streams,
+    # after any routing hint has ended.
+    return incidents.using(incidents.db).values(
+        'id', 'description', 'date_time', 'severity_level', *fields,
+        latitude=F('location__latitude'),
+        longitude=F('location__longitude'),
+        city=F('location__city'),
+    )
+
+
+def station_rows(stations):
+    # The station's roster comes along in the same query
+    return stations.using(stations.db).values(
+        'id', 'name', 'latitude', 'longitude',
+        **{f'roster_{field}': F(f'roster__{field}') for field in ROSTER_FIELDS},
+    )
+
+
+def feature_collection(rows, to_feature):
+    """
+    Yield a GeoJSON FeatureCollection piece by piece, one feature per row, so
+    the response never holds more than a database chunk in memory.
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for row in rows:
+        if row['latitude'] is None or row['longitude'] is None:
+            continue
+        yield separator + json.dumps(to_feature(row), cls=DjangoJSONEncoder)
+        separator = ','
+    yield ']}'
+
+
+async def afeature_collection(rows, to_feature):
+    # feature_collection() over an async iterator, for the ASGI views
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    async for row in rows:
+        if row['latitude'] is None or row['longitude'] is None:
+            continue
+        yield separator + json.dumps(to_feature(row), cls=DjangoJSONEncoder)
+        separator = ','
+    yield ']}'
+
+
+def point(row, properties):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [float(row['longitude']), float(row['latitude'])]},
+        'properties': properties,
+    }
+
+
+def incident_feature(row):
+    return point(row, {
+        'id': row['id'],
+        'city': row['city'],
+        'description': row['description'],
+        'date': row['date_time'].strftime('%Y-%m-%d %H:%M') if row['date_time'] else 'N/A',
+        'severity': row['severity_level'],
+    })
+
+
+def station_feature(row):
+    return point(row, {
+        'id': row['id'],
+        'name': row['name'],
+        'trucks': row['roster_trucks'] or 0,
+        'capacity_liters': row['roster_capacity'] or 0,
+        'firefighters': row['roster_firefighters'] or 0,
+        'crew': {level: row[f'roster_{field}'] or 0 for level, field in StationRoster.LEVEL_FIELDS.items()},
+    })
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from fire import charts, geojson
+from fire.cache import model_versions
+from fire.models import Incident, Locations
+from fire.pagination import decode_cursor, encode_position
+
+POLL_SECONDS = 2
+HEARTBEAT_SECONDS = 15
+STREAM_SECONDS = 300  # then the browser reconnects with Last-Event-ID
+# Longest a long-poll request (the feed under WSGI) waits for a change,
+# holding its worker thread
+LONG_POLL_SECONDS = 10
+RETRY_MS = 3000
+BATCH_SIZE = 100
+# Rows are only sent once they are this old, so a transaction that commits
+# a little after a later one cannot slip in behind the cursor.
+SETTLE_SECONDS = 1
+
+
+def event(name, data, id=None):
+    # One (name, data, id) change as a Server-Sent Event
+    lines = [f'event: {name}']
+    if id is not None:
+        lines.append(f'id: {id}')
+    lines.append('data: ' + json.dumps(data, cls=DjangoJSONEncoder))
+    return '\n'.join(lines) + '\n\n'
+
+
+def diff(old, new):
+    """
+    The parts of ``new`` that differ from ``old``, recursing into dicts.
+    Keys missing from ``new`` come back as None.
+    """
+    changes = {}
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            nested = diff(old[key], value)
+            if nested:
+                changes[key] = nested
+        elif old.get(key) != value or key not in old:
+            changes[key] = value
+    for key in old.keys() - new.keys():
+        changes[key] = None
+    return changes
+
+
+def latest_position():
+    latest = Incident.objects.order_by('-updated_at', '-id').values_list('updated_at', 'id').first()
+    return latest or (timezone.now(), 0)
+
+
+def changed_incidents(position):
+    # Incidents saved after (updated_at, id), oldest first, via the updated_at index
+    updated_at, pk = position
+    incidents = Incident.objects.filter(
+        Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk),
+        updated_at__lte=timezone.now() - timedelta(seconds=SETTLE_SECONDS),
+    ).order_by('updated_at', 'id')
+    return list(geojson.incident_rows(incidents, 'updated_at')[:BATCH_SIZE])
+
+
+class IncidentFeed:
+    """
+    State of one live connection: the position in the incident change log
+    and the dashboard series the client was last sent.
+
+    The database is only queried when the Incident/Locations cache version
+    moves (a cache read per tick otherwise), and every HEARTBEAT_SECONDS in
+    case the cache is per-process. Chart series come from the versioned
+    cache, so they are computed once per change, not once per client.
+    """
+
+    def __init__(self, last_event_id=None, charts=True):
+        try:
+            self.position = decode_cursor(last_event_id) if last_event_id else None
+        except ValueError:
+            self.position = None
+        if self.position is None:
+            self.position = latest_position()
+        self.version = None
+        self.recheck_at = None
+        self.send_charts = charts
+        self.dashboard = None
+        self.started = self.last_sent = time.monotonic()
+
+    def expired(self):
+        return time.monotonic() - self.started >= STREAM_SECONDS
+
+    def tick(self):
+        # Server-Sent Events to write now: the changes, or a keepalive
+        now = time.monotonic()
+        due = now - self.last_sent >= HEARTBEAT_SECONDS
+        events = [event(*change) for change in self.poll(force=due)]
+        if not events and due:
+            events = [': keepalive\n\n']
+        if events:
+            self.last_sent = now
+        return events
+
+    def poll(self, force=False):
+        # [(name, data, id)] changed since the last poll
+        version = model_versions(Incident, Locations)
+        recheck = self.recheck_at is not None and time.monotonic() >= self.recheck_at
+        if version == self.version and not force and not recheck:
+            return []
+        if version != self.version:
+            # Look again once the rows written with this change have settled
+            self.recheck_at = time.monotonic() + SETTLE_SECONDS
+        elif recheck:
+            self.recheck_at = None
+        self.version = version
+
+        events = []
+        rows = changed_incidents(self.position)
+        for row in rows:
+            self.position = (row['updated_at'], row['id'])
+            if row['latitude'] is not None and row['longitude'] is not None:
+                events.append(('incident', geojson.incident_feature(row), encode_position(*self.position)))
+        if len(rows) == BATCH_SIZE:
+            self.version = None  # more to send on the next tick
+
+        if not self.send_charts:
+            return events
+        dashboard = charts.dashboard_data()
+        if self.dashboard is None:
+            events.append(('dashboard', dashboard, None))
+        else:
+            changes = diff(self.dashboard, dashboard)
+            if changes:
+                events.append(('charts', changes, None))
+        self.dashboard = dashboard
+        return events
+
+
+def long_poll(feed, dashboard_etag=None):
+    """
+    One long-poll answer for the feed under WSGI, where a stream would hold
+    a worker thread for STREAM_SECONDS: ([(name, data, id)], dashboard etag).
+
+    Returns as soon as an incident has changed, or, given the client's
+    ``dashboard_etag``, as soon as the dashboard's differs (the client then
+    refetches /dashboard/data), and after LONG_POLL_SECONDS otherwise. The
+    feed is created with charts=False.
+    """
+    deadline = time.monotonic() + LONG_POLL_SECONDS
+    version = None
+    while True:
+        events = feed.poll(force=version is None)
+        if dashboard_etag is not None and feed.version != version:
+            etag = charts.dashboard_etag(None)
+            if etag != dashboard_etag:
+                return events, etag
+        version = feed.version
+        if events or time.monotonic() >= deadline:
+            return events, dashboard_etag
+        time.sleep(POLL_SECONDS)
+
+
+async def aevent_stream(feed):
+    yield f'retry: {RETRY_MS}\n\n'
+    while not feed.expired():
+        for chunk in await sync_to_async(feed.tick)():
+            yield chunk
+        await asyncio.sleep(POLL_SECONDS)
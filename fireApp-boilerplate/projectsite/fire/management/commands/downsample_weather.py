@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from fire import weather
+
+
+class Command(BaseCommand):
+    help = ("Roll aged minute weather readings up to hourly rows, and aged hourly rows up to daily rows. "
+            "Run it periodically (every few minutes, from cron or a scheduler): ingestion does not.")
+
+    def handle(self, *args, **options):
+        hourly, daily = weather.downsample()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {hourly} hourly and {daily} daily weather rows."))
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from fire import exports, geojson
+
+
+class Command(BaseCommand):
+    help = "Stream incidents joined with their location and weather as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--output", default="-", help="File to write, or - for stdout (default).")
+        parser.add_argument("--start", help="Earliest date_time (YYYY-MM-DD or ISO datetime).")
+        parser.add_argument("--end", help="Latest date_time (YYYY-MM-DD or ISO datetime).")
+        parser.add_argument("--country")
+        parser.add_argument("--severity", help="Comma-separated severity levels.")
+
+    def handle(self, *args, **options):
+        params = QueryDict(mutable=True)
+        for name in ("start", "end", "country", "severity"):
+            if options[name]:
+                params[name] = options[name]
+        try:
+            rows = exports.export_rows(params)
+        except geojson.FilterError as e:
+            raise CommandError(str(e))
+
+        to_lines = exports.FORMATS[options["format"]][0]
+        output = sys.stdout if options["output"] == "-" else open(options["output"], "w", newline="", encoding="utf-8")
+        try:
+            for line in to_lines(rows):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,172 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from fire import rollups, search, spatial
+from fire.cache import bump_version_on_commit
+from fire.models import Incident, Locations
+
+LOCATION_FIELDS = ('name', 'address', 'city', 'country')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield row
+
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield RowError(f"invalid JSON: {e}")
+                continue
+            if isinstance(row, dict):
+                yield row
+            else:
+                yield RowError(f"expected a JSON object, got {type(row).__name__}")
+
+
+def parse_coordinate(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f"invalid coordinate {value!r}")
+
+
+def parse_row(row):
+    """
+    One input record as (location key, location fields, incident fields).
+    Location columns are ``location_name``, ``address``, ``city``,
+    ``country``, ``latitude`` and ``longitude``.
+    """
+    location = {
+        'name': (row.get('location_name') or '').strip(),
+        'address': (row.get('address') or '').strip(),
+        'city': (row.get('city') or '').strip(),
+        'country': (row.get('country') or '').strip(),
+        'latitude': parse_coordinate(row.get('latitude')),
+        'longitude': parse_coordinate(row.get('longitude')),
+    }
+    if not location['name']:
+        raise RowError("missing location_name")
+
+    severity_level = (row.get('severity_level') or '').strip()
+    if severity_level not in dict(Incident.SEVERITY_CHOICES):
+        raise RowError(f"unknown severity_level {severity_level!r}")
+
+    date_time = None
+    if row.get('date_time'):
+        date_time = parse_datetime(str(row['date_time']).strip())
+        if date_time is None:
+            raise RowError(f"invalid date_time {row['date_time']!r}")
+        if timezone.is_naive(date_time):
+            date_time = timezone.make_aware(date_time)
+
+    incident = {
+        'date_time': date_time,
+        'severity_level': severity_level,
+        'description': (row.get('description') or '').strip()[:250],
+    }
+    key = tuple(location[field] for field in LOCATION_FIELDS)
+    return key, location, incident
+
+
+class Command(BaseCommand):
+    help = "Bulk-load incidents (and their locations) from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV/NDJSON file, or - for stdin.")
+        parser.add_argument("--format", choices=["csv", "ndjson"],
+                            help="Input format; guessed from the file extension when omitted.")
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Rows written per transaction (default: 5000).")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        # Every existing location, keyed the way input rows are matched
+        self.locations = {
+            key[:-1]: key[-1]
+            for key in Locations.objects.values_list(*LOCATION_FIELDS, 'id').iterator()
+        }
+        self.imported = self.skipped = self.new_locations = 0
+        self.started = time.monotonic()
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            reader = read_ndjson(stream) if fmt == "ndjson" else read_csv(stream)
+            batch = []
+            for line, row in enumerate(reader, start=1):
+                try:
+                    if isinstance(row, RowError):
+                        raise row
+                    batch.append(parse_row(row))
+                except RowError as e:
+                    self.skipped += 1
+                    self.stderr.write(f"record {line}: {e}")
+                    continue
+                if len(batch) >= batch_size:
+                    self.write_batch(batch)
+                    batch = []
+            if batch:
+                self.write_batch(batch)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.imported} incidents ({self.new_locations} new locations, "
+            f"{self.skipped} skipped) in {elapsed:.1f}s, "
+            f"{self.imported / elapsed if elapsed else 0:.0f} rows/s."))
+
+    @transaction.atomic
+    def write_batch(self, batch):
+        new = {}
+        for key, location, incident in batch:
+            if key not in self.locations and key not in new:
+                new[key] = Locations(
+                    geohash=spatial.geohash_for(location['latitude'], location['longitude']),
+                    **location)
+        if new:
+            Locations.objects.bulk_create(new.values())
+            for key, obj in new.items():
+                self.locations[key] = obj.pk
+            self.new_locations += len(new)
+            bump_version_on_commit(Locations)
+
+        incidents = Incident.objects.bulk_create(
+            [Incident(location_id=self.locations[key], **incident) for key, location, incident in batch])
+
+        # bulk_create skips signals, so the search index and the rollup are
+        # updated here
+        search.index_incidents([incident.pk for incident in incidents])
+        rollups.apply_deltas(Counter(
+            (rollups.incident_day(incident['date_time']), incident['severity_level'], key[3], key[2])
+            for key, location, incident in batch))
+        bump_version_on_commit(Incident)
+
+        self.imported += len(batch)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"{self.imported} rows, {self.imported / elapsed if elapsed else 0:.0f} rows/s")
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from fire import sync
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.SYNC_TOMBSTONE_DAYS,
+                            help="Keep tombstones this many days (default: SYNC_TOMBSTONE_DAYS). "
+                                 "Going below SYNC_TOMBSTONE_DAYS lets clients with older cursors miss deletes.")
+
+    def handle(self, *args, **options):
+        deleted = sync.prune_tombstones(timezone.now() - timedelta(days=options["days"]))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fire import rollups
+from fire.cache import bump_version
+from fire.models import Incident
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-day incident rollup table from fire_incident."
+
+    def handle(self, *args, **options):
+        buckets = rollups.rebuild()
+        bump_version(Incident)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt incident rollups: {buckets} buckets."))
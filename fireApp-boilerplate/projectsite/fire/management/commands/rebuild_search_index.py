@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from fire import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the incident full-text search index from fire_incident and fire_locations."
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt incident search index: {indexed} incidents."))
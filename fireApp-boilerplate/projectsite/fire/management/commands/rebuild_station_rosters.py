@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fire import rosters
+from fire.cache import bump_version
+from fire.models import FireStation
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-station truck, water and crew rosters from fire_firetruck and fire_firefighters."
+
+    def handle(self, *args, **options):
+        stations = rosters.rebuild()
+        bump_version(FireStation)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt station rosters: {stations} stations."))
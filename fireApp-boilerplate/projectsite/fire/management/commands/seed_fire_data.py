@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fire import seed
+
+
+class Command(BaseCommand):
+    help = "Add synthetic stations, crews, trucks, locations, incidents and weather for testing at volume."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stations", type=int, default=10)
+        parser.add_argument("--firefighters", type=int, default=6, help="Firefighters per station (default: 6).")
+        parser.add_argument("--trucks", type=int, default=2, help="Trucks per station (default: 2).")
+        parser.add_argument("--locations", type=int, default=200)
+        parser.add_argument("--incidents", type=int, default=1000)
+        parser.add_argument("--weather", type=float, default=0.5,
+                            help="Share of incidents with a weather reading, 0-1 (default: 0.5).")
+        parser.add_argument("--seed", type=int, help="Random seed, for repeatable data.")
+
+    def handle(self, *args, **options):
+        sizes = ("stations", "firefighters", "trucks", "locations", "incidents")
+        if any(options[name] < 0 for name in sizes):
+            raise CommandError("counts must not be negative")
+        if not 0 <= options["weather"] <= 1:
+            raise CommandError("--weather must be between 0 and 1")
+        if options["incidents"] and not options["locations"]:
+            raise CommandError("incidents need at least one location")
+
+        started = time.monotonic()
+        counts = seed.seed(
+            stations=options["stations"],
+            firefighters=options["firefighters"],
+            trucks=options["trucks"],
+            locations=options["locations"],
+            incidents=options["incidents"],
+            weather=options["weather"],
+            random_seed=options["seed"],
+        )
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary} in {time.monotonic() - started:.1f}s."))
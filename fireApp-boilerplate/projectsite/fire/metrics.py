@@ -0,0 +1,193 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+from fire import slowqueries
+
+# Latency histogram upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_SECONDS = 5
+
+# Query stats of the request being served. A context variable, so queries
+# run on sync_to_async threads are counted against the right request.
+current = ContextVar('fire_request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.view = ''
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add(self, seconds):
+        with self.lock:
+            self.queries += 1
+            self.query_seconds += seconds
+
+
+def record_query(execute, sql, params, many, context):
+    # Connection execute wrapper, installed on every connection (see fire/signals.py)
+    stats = current.get()
+    slow = slowqueries.threshold()
+    if stats is None and slow is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        if stats is not None:
+            stats.add(seconds)
+        if slow is not None and seconds >= slow:
+            slowqueries.capture(context['connection'], sql, params, many, seconds, stats.view if stats else '')
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.url_name or match.route
+
+
+class Registry:
+    """
+    This process's aggregates. With METRICS_DIR set, every process writes
+    its snapshot there (at most every FLUSH_SECONDS) and /metrics sums the
+    snapshots of all of them; otherwise only this process is reported.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.path = None
+        self.flushed_at = 0.0
+        self.requests = Counter()  # (view, method, status)
+        self.latency = {}  # view -> per-bucket counts, last one is +Inf
+        self.latency_sum = Counter()
+        self.queries = Counter()
+        self.query_seconds = Counter()
+
+    def observe(self, view, method, status, seconds, stats):
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()  # forked worker: start from zero, in its own file
+            self.requests[(view, method, str(status))] += 1
+            self.latency.setdefault(view, [0] * (len(BUCKETS) + 1))[bucket] += 1
+            self.latency_sum[view] += seconds
+            self.queries[view] += stats.queries
+            self.query_seconds[view] += stats.query_seconds
+        self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'latency': {view: list(counts) for view, counts in self.latency.items()},
+                'latency_sum': dict(self.latency_sum),
+                'queries': dict(self.queries),
+                'query_seconds': dict(self.query_seconds),
+            }
+
+    def flush(self, force=False):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory or (not force and time.monotonic() - self.flushed_at < FLUSH_SECONDS):
+            return
+        # One writer at a time; a request never waits for another's flush
+        if not self.flush_lock.acquire(blocking=force):
+            return
+        try:
+            self.flushed_at = time.monotonic()
+            if self.path is None:
+                self.path = Path(directory) / f'{self.pid}-{time.time_ns()}.json'
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.snapshot()))
+            os.replace(tmp, self.path)
+        finally:
+            self.flush_lock.release()
+
+
+registry = Registry()
+
+
+def observe(request, response, seconds, stats):
+    registry.observe(view_label(request), request.method, response.status_code, seconds, stats)
+
+
+def merge(snapshots):
+    requests, latency = Counter(), {}
+    totals = {name: Counter() for name in ('latency_sum', 'queries', 'query_seconds')}
+    for snapshot in snapshots:
+        for *key, count in snapshot['requests']:
+            requests[tuple(key)] += count
+        for view, counts in snapshot['latency'].items():
+            merged = latency.setdefault(view, [0] * len(counts))
+            for i, count in enumerate(counts):
+                merged[i] += count
+        for name, counter in totals.items():
+            counter.update(snapshot[name])
+    return {'requests': [[*key, count] for key, count in requests.items()], 'latency': latency,
+            **{name: dict(counter) for name, counter in totals.items()}}
+
+
+def collect():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return registry.snapshot()
+    registry.flush(force=True)
+    snapshots = []
+    for path in Path(directory).glob('*.json'):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # being replaced or removed
+    return merge(snapshots)
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(snapshot):
+    # Prometheus text exposition format 0.0.4
+    lines = [
+        '# HELP fire_http_requests_total Requests served, by view, method and status.',
+        '# TYPE fire_http_requests_total counter',
+    ]
+    for view, method, status, count in sorted(snapshot['requests']):
+        lines.append(f'fire_http_requests_total{{view="{label(view)}",method="{label(method)}",'
+                     f'status="{label(status)}"}} {count}')
+
+    lines += [
+        '# HELP fire_http_request_duration_seconds Time to build the response, by view.',
+        '# TYPE fire_http_request_duration_seconds histogram',
+    ]
+    for view, counts in sorted(snapshot['latency'].items()):
+        cumulative = 0
+        for bound, count in zip([*map(str, BUCKETS), '+Inf'], counts):
+            cumulative += count
+            lines.append(f'fire_http_request_duration_seconds_bucket{{view="{label(view)}",le="{bound}"}} {cumulative}')
+        lines.append(f'fire_http_request_duration_seconds_sum{{view="{label(view)}"}} {snapshot["latency_sum"][view]}')
+        lines.append(f'fire_http_request_duration_seconds_count{{view="{label(view)}"}} {cumulative}')
+
+    for name, key, help_text in (
+        ('fire_db_queries_total', 'queries', 'Database queries run, by view.'),
+        ('fire_db_query_seconds_total', 'query_seconds', 'Time spent in database queries, by view.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for view, value in sorted(snapshot[key].items()):
+            lines.append(f'{name}{{view="{label(view)}"}} {value}')
+    return '\n'.join(lines) + '\n'
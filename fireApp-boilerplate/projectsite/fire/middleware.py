@@ -0,0 +1,101 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from fire import metrics, routers, slowqueries
+
+PIN_COOKIE = 'fire_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keeps read-after-write flows on the primary: a request that may modify
+    data reads from the primary and sets a short-lived cookie, and requests
+    carrying it skip the replicas until replication has had time to catch up.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.pinned_to_primary.set(self.pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.pinned_to_primary.reset(token)
+        return self.pin_after_write(request, response)
+
+    async def __acall__(self, request):
+        token = routers.pinned_to_primary.set(self.pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.pinned_to_primary.reset(token)
+        return self.pin_after_write(request, response)
+
+    def pinned(self, request):
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def pin_after_write(self, request, response):
+        if request.method not in SAFE_METHODS and routers.replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax')
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Request count, latency, query count and query time per URL name, for
+    /metrics (fire/metrics.py). Latency is measured until the response is
+    returned, so a streaming body is not included. Slow queries the request
+    runs are queued and saved once it has finished (fire/signals.py).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        slowqueries.start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        metrics.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        slowqueries.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        metrics.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The URL is resolved by now: name the view for the slow-query log
+        stats = metrics.current.get()
+        if stats is not None:
+            stats.view = metrics.view_label(request)
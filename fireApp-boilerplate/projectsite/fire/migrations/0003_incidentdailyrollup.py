@@ -0,0 +1,50 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:21
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Incident = apps.get_model('fire', 'Incident')
+    IncidentDailyRollup = apps.get_model('fire', 'IncidentDailyRollup')
+    buckets = (Incident.objects
+               .annotate(day=TruncDate('date_time'))
+               .values('day', 'severity_level', 'location__country', 'location__city')
+               .annotate(n=Count('id'))
+               .order_by())
+    IncidentDailyRollup.objects.bulk_create([
+        IncidentDailyRollup(
+            day=row['day'], severity_level=row['severity_level'],
+            country=row['location__country'], city=row['location__city'], count=row['n'])
+        for row in buckets
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0002_alter_firefighters_experience_level_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncidentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('severity_level', models.CharField(max_length=45)),
+                ('country', models.CharField(max_length=150)),
+                ('city', models.CharField(max_length=150)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['country', 'day'], name='rollup_country_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='incidentdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'severity_level', 'country', 'city'), name='unique_incident_rollup_bucket'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+# A copy of the encoder in fire.spatial as it was when this migration was
+# written, so later changes there cannot change what it stores.
+
+GEOHASH_PRECISION = 12
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return ''
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < GEOHASH_PRECISION:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def populate_geohashes(apps, schema_editor):
+    for model_name in ('Locations', 'FireStation'):
+        model = apps.get_model('fire', model_name)
+        rows = model.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        batch = []
+        for row in rows.only('id', 'latitude', 'longitude').iterator():
+            row.geohash = geohash_for(row.latitude, row.longitude)
+            batch.append(row)
+            if len(batch) == 1000:
+                model.objects.bulk_update(batch, ['geohash'])
+                batch = []
+        model.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0004_index_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='firestation',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='locations',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='firestation',
+            index=models.Index(fields=['latitude', 'longitude'], name='firestation_lat_lon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locations',
+            index=models.Index(fields=['latitude', 'longitude'], name='locations_lat_lon_idx'),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0005_geohash_spatial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['date_time', 'severity_level'], name='incident_date_severity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['location', 'date_time'], name='incident_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locations',
+            index=models.Index(fields=['country', 'city'], name='locations_country_city_idx'),
+        ),
+    ]
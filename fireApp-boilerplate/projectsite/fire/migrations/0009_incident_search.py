@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# The full-text index read by fire/search.py. Raw SQL, as neither an FTS5
+# virtual table nor a tsvector column has a portable model field; on other
+# databases nothing is created and search falls back to substring matching.
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE fire_incident_search USING fts5(
+    description, location_name, address, city,
+    tokenize = 'porter unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+SQLITE_POPULATE = """
+INSERT INTO fire_incident_search (rowid, description, location_name, address, city)
+SELECT i.id, i.description, l.name, l.address, l.city
+FROM fire_incident i JOIN fire_locations l ON l.id = i.location_id
+"""
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE fire_incident_search (
+        incident_id bigint PRIMARY KEY REFERENCES fire_incident (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX fire_incident_search_document_idx ON fire_incident_search USING GIN (document)",
+]
+POSTGRES_POPULATE = """
+INSERT INTO fire_incident_search (incident_id, document)
+SELECT i.id,
+       setweight(to_tsvector('english', i.description), 'A')
+       || setweight(to_tsvector('english', l.name), 'B')
+       || setweight(to_tsvector('english', l.address || ' ' || l.city), 'C')
+FROM fire_incident i JOIN fire_locations l ON l.id = i.location_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_POPULATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+        schema_editor.execute(POSTGRES_POPULATE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS fire_incident_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0008_slowquery'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0009_incident_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='firestation',
+            index=models.Index(fields=['name'], name='firestation_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locations',
+            index=models.Index(fields=['name'], name='locations_name_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0010_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeatherReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField()),
+                ('interval', models.PositiveIntegerField(default=60)),
+                ('samples', models.PositiveIntegerField(default=1)),
+                ('temperature', models.FloatField()),
+                ('humidity', models.FloatField()),
+                ('wind_speed', models.FloatField()),
+                ('wind_speed_max', models.FloatField()),
+                ('incident', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='fire.incident')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['interval', 'time'], name='weather_reading_age_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weatherreading',
+            constraint=models.UniqueConstraint(fields=('incident', 'time', 'interval'), name='unique_weather_reading'),
+        ),
+    ]
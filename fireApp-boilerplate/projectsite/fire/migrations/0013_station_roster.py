@@ -0,0 +1,102 @@
+import re
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+# FireTruck.capacity was free text ("3000", "3,000 L"); it becomes liters so
+# rosters can sum it. Text without a number becomes 0.
+
+NUMBER = re.compile(r'\d+(?:\.\d+)?')
+LEVEL_FIELDS = {
+    'Probationary Firefighter': 'probationary',
+    'Firefighter I': 'firefighter_1',
+    'Firefighter II': 'firefighter_2',
+    'Firefighter III': 'firefighter_3',
+    'Driver': 'drivers',
+    'Captain': 'captains',
+    'Battalion Chief': 'battalion_chiefs',
+}
+
+
+def capacity_to_liters(apps, schema_editor):
+    FireTruck = apps.get_model('fire', 'FireTruck')
+    trucks = []
+    for truck in FireTruck.objects.only('capacity_text').iterator():
+        match = NUMBER.search((truck.capacity_text or '').replace(',', ''))
+        truck.capacity = round(float(match.group())) if match else 0
+        trucks.append(truck)
+    FireTruck.objects.bulk_update(trucks, ['capacity'], batch_size=1000)
+
+
+def liters_to_capacity(apps, schema_editor):
+    FireTruck = apps.get_model('fire', 'FireTruck')
+    trucks = list(FireTruck.objects.only('capacity'))
+    for truck in trucks:
+        truck.capacity_text = str(truck.capacity)
+    FireTruck.objects.bulk_update(trucks, ['capacity_text'], batch_size=1000)
+
+
+def populate_rosters(apps, schema_editor):
+    FireStation = apps.get_model('fire', 'FireStation')
+    FireTruck = apps.get_model('fire', 'FireTruck')
+    Firefighters = apps.get_model('fire', 'Firefighters')
+    StationRoster = apps.get_model('fire', 'StationRoster')
+    rosters = {pk: StationRoster(station_id=pk) for pk in FireStation.objects.values_list('pk', flat=True)}
+    for row in FireTruck.objects.values('station_id').annotate(n=Count('id'), liters=Sum('capacity')).order_by():
+        rosters[row['station_id']].trucks = row['n']
+        rosters[row['station_id']].capacity = row['liters'] or 0
+    for row in Firefighters.objects.values('station_id', 'experience_level').annotate(n=Count('id')).order_by():
+        roster = rosters[row['station_id']]
+        roster.firefighters += row['n']
+        if row['experience_level'] in LEVEL_FIELDS:
+            setattr(roster, LEVEL_FIELDS[row['experience_level']], row['n'])
+    StationRoster.objects.bulk_create(rosters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='firetruck',
+            old_name='capacity',
+            new_name='capacity_text',
+        ),
+        migrations.AlterField(
+            model_name='firetruck',
+            name='capacity_text',
+            field=models.CharField(max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name='firetruck',
+            name='capacity',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(capacity_to_liters, liters_to_capacity),
+        migrations.RemoveField(
+            model_name='firetruck',
+            name='capacity_text',
+        ),
+        migrations.CreateModel(
+            name='StationRoster',
+            fields=[
+                ('station', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='roster', serialize=False, to='fire.firestation')),
+                ('trucks', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveBigIntegerField(default=0)),
+                ('firefighters', models.PositiveIntegerField(default=0)),
+                ('probationary', models.PositiveIntegerField(default=0)),
+                ('firefighter_1', models.PositiveIntegerField(default=0)),
+                ('firefighter_2', models.PositiveIntegerField(default=0)),
+                ('firefighter_3', models.PositiveIntegerField(default=0)),
+                ('drivers', models.PositiveIntegerField(default=0)),
+                ('captains', models.PositiveIntegerField(default=0)),
+                ('battalion_chiefs', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_rosters, migrations.RunPython.noop),
+    ]
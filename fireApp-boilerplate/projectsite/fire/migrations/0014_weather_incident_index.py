@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0013_station_roster'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='weatherconditions',
+            index=models.Index(fields=['incident', 'id'], name='weather_incident_id_idx'),
+        ),
+    ]
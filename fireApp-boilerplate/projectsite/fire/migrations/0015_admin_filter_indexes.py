@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0014_weather_incident_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='firefighters',
+            index=models.Index(fields=['experience_level', 'id'], name='firefighter_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['severity_level', 'date_time', 'id'], name='incident_severity_date_idx'),
+        ),
+    ]
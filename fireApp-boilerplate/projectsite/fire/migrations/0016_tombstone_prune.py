@@ -0,0 +1,22 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0015_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TombstonePrune',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('horizon', models.DateTimeField(db_index=True)),
+                ('deleted', models.PositiveIntegerField()),
+                ('pruned_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -3,7 +3,7 @@ from django.db import models
 
 class BaseModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         abstract = True
@@ -18,6 +18,14 @@ class Locations(BaseModel):
     address = models.CharField(max_length=150)
     city = models.CharField(max_length=150)  # can be in separate table
     country = models.CharField(max_length=150)  # can be in separate table
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)  # set from latitude/longitude on save
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='locations_lat_lon_idx'),
+            models.Index(fields=['country', 'city'], name='locations_country_city_idx'),
+            models.Index(fields=['name'], name='locations_name_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.address}, {self.city}, {self.country}"
@@ -33,6 +41,13 @@ class Incident(BaseModel):
     date_time = models.DateTimeField(blank=True, null=True)
     severity_level = models.CharField(max_length=45, choices=SEVERITY_CHOICES)
     description = models.CharField(max_length=250)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_time', 'severity_level'], name='incident_date_severity_idx'),
+            models.Index(fields=['location', 'date_time'], name='incident_location_date_idx'),
+            models.Index(fields=['severity_level', 'date_time', 'id'], name='incident_severity_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.severity_level} at {self.location.name} on {self.date_time}"
@@ -47,6 +62,13 @@ class FireStation(BaseModel):
     address = models.CharField(max_length=150)
     city = models.CharField(max_length=150)  # can be in separate table
     country = models.CharField(max_length=150)  # can be in separate table
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)  # set from latitude/longitude on save
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='firestation_lat_lon_idx'),
+            models.Index(fields=['name'], name='firestation_name_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.city}, {self.country}"
@@ -66,6 +88,11 @@ class Firefighters(BaseModel):
     rank = models.CharField(max_length=150)
     experience_level = models.CharField(max_length=45, null=True, blank=True, choices=XP_CHOICES)
     station = models.ForeignKey(FireStation, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['experience_level', 'id'], name='firefighter_level_idx'),
+        ]
     
     def __str__(self):
         return f"{self.rank} {self.name} - {self.experience_level} at {self.station.name}"
@@ -74,7 +101,7 @@ class Firefighters(BaseModel):
 class FireTruck(BaseModel):
     truck_number = models.CharField(max_length=150)
     model = models.CharField(max_length=150)
-    capacity = models.CharField(max_length=150)  # water
+    capacity = models.PositiveIntegerField()  # water, in liters
     station = models.ForeignKey(FireStation, on_delete=models.CASCADE)
     
     def __str__(self):
@@ -87,6 +114,147 @@ class WeatherConditions(BaseModel):
     humidity = models.DecimalField(max_digits=10, decimal_places=2)
     wind_speed = models.DecimalField(max_digits=10, decimal_places=2)
     weather_description = models.CharField(max_length=150)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['incident', 'id'], name='weather_incident_id_idx'),
+        ]
     
     def __str__(self):
         return f"Weather for {self.incident.description} - {self.temperature}°C, {self.weather_description}"
+
+
+class IncidentDailyRollup(models.Model):
+    # Per-day incident counts, maintained from Incident saves/deletes (see fire/rollups.py)
+    day = models.DateField(null=True, blank=True)
+    severity_level = models.CharField(max_length=45)
+    country = models.CharField(max_length=150)
+    city = models.CharField(max_length=150)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'severity_level', 'country', 'city'],
+                name='unique_incident_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['country', 'day'], name='rollup_country_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.severity_level} in {self.city}, {self.country}: {self.count}"
+
+
+class StationRoster(models.Model):
+    # Trucks, water and crew per station, maintained from FireTruck and
+    # Firefighters saves/deletes (see fire/rosters.py)
+    LEVEL_FIELDS = {
+        'Probationary Firefighter': 'probationary',
+        'Firefighter I': 'firefighter_1',
+        'Firefighter II': 'firefighter_2',
+        'Firefighter III': 'firefighter_3',
+        'Driver': 'drivers',
+        'Captain': 'captains',
+        'Battalion Chief': 'battalion_chiefs',
+    }
+    station = models.OneToOneField(FireStation, on_delete=models.CASCADE, primary_key=True, related_name='roster')
+    trucks = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveBigIntegerField(default=0)  # water, in liters
+    firefighters = models.PositiveIntegerField(default=0)
+    probationary = models.PositiveIntegerField(default=0)
+    firefighter_1 = models.PositiveIntegerField(default=0)
+    firefighter_2 = models.PositiveIntegerField(default=0)
+    firefighter_3 = models.PositiveIntegerField(default=0)
+    drivers = models.PositiveIntegerField(default=0)
+    captains = models.PositiveIntegerField(default=0)
+    battalion_chiefs = models.PositiveIntegerField(default=0)
+
+    def crew(self):
+        # {experience level: firefighters}
+        return {level: getattr(self, field) for level, field in self.LEVEL_FIELDS.items()}
+
+    def __str__(self):
+        return f"Station {self.station_id}: {self.trucks} trucks, {self.capacity} L, {self.firefighters} firefighters"
+
+
+class Tombstone(BaseModel):
+    # A deleted row, kept so sync clients can drop it too (see fire/sync.py)
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'updated_at', 'id'], name='tombstone_model_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted {self.created_at}"
+
+
+class TombstonePrune(models.Model):
+    # A prune_tombstones run that deleted tombstones: sync cursors from before
+    # ``horizon``, the newest one it deleted, may have missed those deletes
+    horizon = models.DateTimeField(db_index=True)
+    deleted = models.PositiveIntegerField()
+    pruned_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.deleted} tombstones up to {self.horizon} pruned {self.pruned_at}"
+
+
+class SlowQuery(models.Model):
+    # A query slower than SLOW_QUERY_MS, with its plan (see fire/slowqueries.py)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    database = models.CharField(max_length=50)
+    view = models.CharField(max_length=200, blank=True)
+    duration_ms = models.FloatField()
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    plan = models.TextField(blank=True)
+    full_scan = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name_plural = "slow queries"
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f} ms in {self.view or 'no view'}"
+
+
+class WeatherReading(models.Model):
+    # Sensor weather for an incident, bulk-appended by fire/weather.py. Minute
+    # rows are downsampled to hourly, then daily, rows as they age: ``interval``
+    # is the seconds a row covers and ``samples`` the readings averaged into it.
+    incident = models.ForeignKey(Incident, on_delete=models.CASCADE, db_index=False)
+    time = models.DateTimeField()
+    interval = models.PositiveIntegerField(default=60)
+    samples = models.PositiveIntegerField(default=1)
+    temperature = models.FloatField()
+    humidity = models.FloatField()
+    wind_speed = models.FloatField()
+    wind_speed_max = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['incident', 'time', 'interval'], name='unique_weather_reading'),
+        ]
+        indexes = [
+            models.Index(fields=['interval', 'time'], name='weather_reading_age_idx'),
+        ]
+
+    def __str__(self):
+        return f"Incident {self.incident_id} at {self.time} ({self.interval}s): {self.temperature:.1f}°C"
+
+
+class IdempotencyKey(models.Model):
+    # A bulk write's Idempotency-Key and its response, replayed when the
+    # same request is sent again (see fire/bulk.py)
+    key = models.CharField(max_length=255, unique=True)
+    model = models.CharField(max_length=50)
+    request_hash = models.CharField(max_length=64)
+    status = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.model}, {self.created_at})"
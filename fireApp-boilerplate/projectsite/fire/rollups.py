@@ -0,0 +1,126 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from fire.models import Incident, IncidentDailyRollup
+
+BATCH_SIZE = 500
+
+
+def incident_day(date_time):
+    if date_time is None:
+        return None
+    if timezone.is_aware(date_time):
+        date_time = timezone.localtime(date_time)
+    return date_time.date()
+
+
+def rollup_key(incident):
+    # (day, severity_level, country, city) bucket an incident is counted in
+    location = incident.location
+    return (incident_day(incident.date_time), incident.severity_level, location.country, location.city)
+
+
+def apply_delta(key, delta):
+    if delta == 0:
+        return
+    day, severity_level, country, city = key
+    bucket = IncidentDailyRollup.objects.filter(
+        day=day, severity_level=severity_level, country=country, city=city)
+    if delta < 0:
+        bucket.update(count=Greatest(F('count') + delta, 0))
+        return
+    if bucket.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            IncidentDailyRollup.objects.create(
+                day=day, severity_level=severity_level, country=country, city=city, count=delta)
+    except IntegrityError:
+        # Another writer created the bucket first
+        bucket.update(count=F('count') + delta)
+
+
+def apply_deltas(deltas):
+    """
+    Apply {key: delta} in a fixed number of queries however many buckets
+    there are: one read, one bulk update (of F() increments, so concurrent
+    writers still add up) and one bulk insert. Counts never go below 0.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    days = {key[0] for key in deltas}
+    candidates = IncidentDailyRollup.objects.filter(
+        Q(day__in=days - {None}) | Q(day__isnull=True) if None in days else Q(day__in=days),
+        severity_level__in={key[1] for key in deltas},
+        country__in={key[2] for key in deltas},
+        city__in={key[3] for key in deltas},
+    ).only('id', 'day', 'severity_level', 'country', 'city')
+    existing = {}
+    for bucket in candidates:
+        key = (bucket.day, bucket.severity_level, bucket.country, bucket.city)
+        if key in deltas:
+            bucket.count = Greatest(F('count') + deltas[key], 0)
+            existing[key] = bucket
+    IncidentDailyRollup.objects.bulk_update(existing.values(), ['count'], batch_size=BATCH_SIZE)
+
+    missing = {key: delta for key, delta in deltas.items() if key not in existing and delta > 0}
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            IncidentDailyRollup.objects.bulk_create([
+                IncidentDailyRollup(day=day, severity_level=severity_level, country=country, city=city, count=delta)
+                for (day, severity_level, country, city), delta in missing.items()
+            ], batch_size=BATCH_SIZE)
+    except IntegrityError:
+        # Another writer created some of these buckets first
+        for key, delta in missing.items():
+            apply_delta(key, delta)
+
+
+def move(old_key, new_key):
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        apply_delta(old_key, -1)
+    if new_key is not None:
+        apply_delta(new_key, 1)
+
+
+def relocate(location, old_city, old_country):
+    # A location's city/country changed: move all of its incidents between buckets
+    buckets = (Incident.objects.filter(location=location)
+               .annotate(day=TruncDate('date_time'))
+               .values('day', 'severity_level')
+               .annotate(n=Count('id'))
+               .order_by())
+    deltas = Counter()
+    for row in buckets:
+        deltas[(row['day'], row['severity_level'], old_country, old_city)] -= row['n']
+        deltas[(row['day'], row['severity_level'], location.country, location.city)] += row['n']
+    apply_deltas(deltas)
+
+
+@transaction.atomic
+def rebuild():
+    IncidentDailyRollup.objects.all().delete()
+    buckets = (Incident.objects
+               .annotate(day=TruncDate('date_time'))
+               .values('day', 'severity_level', 'location__country', 'location__city')
+               .annotate(n=Count('id'))
+               .order_by())
+    rows = [IncidentDailyRollup(
+        day=row['day'],
+        severity_level=row['severity_level'],
+        country=row['location__country'],
+        city=row['location__city'],
+        count=row['n'],
+    ) for row in buckets.iterator()]
+    IncidentDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
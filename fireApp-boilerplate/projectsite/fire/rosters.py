@@ -0,0 +1,94 @@
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest
+
+from fire.models import FireStation, Firefighters, FireTruck, StationRoster
+
+
+def contribution(instance):
+    # (station_id, {roster field: amount}) a truck or firefighter adds to its station
+    if isinstance(instance, FireTruck):
+        return instance.station_id, {'trucks': 1, 'capacity': instance.capacity or 0}
+    counts = {'firefighters': 1}
+    level = StationRoster.LEVEL_FIELDS.get(instance.experience_level)
+    if level:
+        counts[level] = 1
+    return instance.station_id, counts
+
+
+def station_counts(station_ids=None):
+    # {station_id: {roster field: amount}} counted from the trucks and
+    # firefighters of ``station_ids``, or of every station
+    trucks, crews = FireTruck.objects.all(), Firefighters.objects.all()
+    if station_ids is not None:
+        trucks, crews = trucks.filter(station_id__in=station_ids), crews.filter(station_id__in=station_ids)
+    counts = defaultdict(Counter)
+    trucks = (trucks
+              .values('station_id')
+              .annotate(n=Count('id'), liters=Sum('capacity'))
+              .order_by())
+    for row in trucks:
+        counts[row['station_id']].update(trucks=row['n'], capacity=row['liters'] or 0)
+    crews = (crews
+             .values('station_id', 'experience_level')
+             .annotate(n=Count('id'))
+             .order_by())
+    for row in crews:
+        counts[row['station_id']]['firefighters'] += row['n']
+        level = StationRoster.LEVEL_FIELDS.get(row['experience_level'])
+        if level:
+            counts[row['station_id']][level] += row['n']
+    return counts
+
+
+def apply_delta(station_id, delta):
+    delta = {field: n for field, n in delta.items() if n}
+    if station_id is None or not delta:
+        return
+    roster = StationRoster.objects.filter(station_id=station_id)
+    # Every field is clamped at 0 on its own, so a roster that has drifted
+    # stays bounded (until rebuild_station_rosters) and still takes the rest
+    # of the change
+    update = {field: Greatest(F(field) + n, 0) if n < 0 else F(field) + n for field, n in delta.items()}
+    if roster.update(**update):
+        return
+    # No roster: it is being deleted with its station, or the station was
+    # created in bulk
+    if all(n < 0 for n in delta.values()):
+        return
+    # No roster yet (a station created in bulk): count it from scratch,
+    # which already includes this change
+    counts = station_counts([station_id]).get(station_id, {})
+    try:
+        with transaction.atomic():
+            StationRoster.objects.create(station_id=station_id, **counts)
+    except IntegrityError:
+        # Another writer created the roster first
+        roster.update(**update)
+
+
+def move(changes):
+    """
+    Apply [(old, new)] contributions, as returned by contribution() or
+    None, with one update per station.
+    """
+    deltas = defaultdict(Counter)
+    for old, new in changes:
+        if old is not None:
+            deltas[old[0]].subtract(old[1])
+        if new is not None:
+            deltas[new[0]].update(new[1])
+    for station_id, delta in deltas.items():
+        apply_delta(station_id, delta)
+
+
+@transaction.atomic
+def rebuild():
+    StationRoster.objects.all().delete()
+    counts = station_counts()
+    rows = [StationRoster(station_id=pk, **counts.get(pk, {}))
+            for pk in FireStation.objects.values_list('pk', flat=True).iterator()]
+    StationRoster.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,87 @@
+import asyncio
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Per-request routing state. Context variables, so they follow the request
+# through threads and async tasks alike.
+use_replica = ContextVar('fire_use_replica', default=False)
+pinned_to_primary = ContextVar('fire_pinned_to_primary', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def replica():
+    token = use_replica.set(True)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+@contextmanager
+def primary():
+    token = pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        pinned_to_primary.reset(token)
+
+
+def read_from_replica(view):
+    """
+    View hint: reads made while the view runs may go to a replica, unless
+    the request is pinned to the primary by a recent write.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            with replica():
+                return await view(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReadReplicaMixin:
+    def dispatch(self, request, *args, **kwargs):
+        with replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes always go to the primary ("default"). Reads go to a random
+    replica only inside a replica hint and only when the request is not
+    pinned to the primary. ReplicaPinningMiddleware does the pinning: for
+    requests that may write (anything but GET/HEAD/OPTIONS/TRACE) and for
+    the requests that follow one, so users read their own changes.
+
+    Django also asks db_for_write() when it is not writing (related
+    managers, for one), so the router only answers and changes no state.
+    """
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if aliases and use_replica.get() and not pinned_to_primary.get():
+            return random.choice(aliases)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
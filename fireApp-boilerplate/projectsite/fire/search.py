@@ -0,0 +1,191 @@
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from fire.models import Incident, Locations
+
+# Full-text index over each incident's description and its location's name,
+# address and city. SQLite: an FTS5 table keyed by rowid = incident id.
+# PostgreSQL: a tsvector per incident with a GIN index. Both are created by
+# migration 0009 and kept current from the Incident/Locations signals.
+SEARCH_TABLE = 'fire_incident_search'
+VENDORS = ('sqlite', 'postgresql')
+BATCH_SIZE = 500
+MAX_TERMS = 8
+# Only this many matches, the newest, are ranked, so a common word costs
+# the same however many incidents it matches
+MAX_CANDIDATES = 1000
+TERM = re.compile(r'\w+')
+
+INCIDENTS = Incident._meta.db_table
+LOCATIONS = Locations._meta.db_table
+SOURCE = f'{INCIDENTS} i JOIN {LOCATIONS} l ON l.id = i.location_id'
+
+# Column weights: description first, then the location name, then address and city
+SQLITE_RANK = f'bm25({SEARCH_TABLE}, 4.0, 2.0, 1.0, 1.0)'
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('english', i.description), 'A')"
+    " || setweight(to_tsvector('english', l.name), 'B')"
+    " || setweight(to_tsvector('english', l.address || ' ' || l.city), 'C')"
+)
+
+
+class SearchError(ValueError):
+    pass
+
+
+def terms(query):
+    return TERM.findall((query or '').lower())[:MAX_TERMS]
+
+
+def match_expression(vendor, words):
+    # Every word must match; the last one also as a prefix, for search-as-you-type
+    if vendor == 'postgresql':
+        return ' & '.join(words[:-1] + [f'{words[-1]}:*'])
+    return ' '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+
+
+# === INDEX MAINTENANCE ===
+
+def write_connection():
+    return connections[router.db_for_write(Incident)]
+
+
+def chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def reindex(connection, where, params):
+    # (Re)write the entries of the incidents matching ``where`` (over i and l)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT i.id FROM {SOURCE} WHERE {where})', params)
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, description, location_name, address, city) '
+                f'SELECT i.id, i.description, l.name, l.address, l.city FROM {SOURCE} WHERE {where}', params)
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (incident_id, document) '
+                f'SELECT i.id, {POSTGRES_DOCUMENT} FROM {SOURCE} WHERE {where} '
+                f'ON CONFLICT (incident_id) DO UPDATE SET document = EXCLUDED.document', params)
+
+
+def index_incidents(ids):
+    connection = write_connection()
+    if connection.vendor not in VENDORS:
+        return
+    for batch in chunks(ids):
+        reindex(connection, f"i.id IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def index_location(location_id):
+    # A location's name, address or city changed: every incident there is stale
+    connection = write_connection()
+    if connection.vendor in VENDORS:
+        reindex(connection, 'i.location_id = %s', [location_id])
+
+
+def remove_incidents(ids):
+    connection = write_connection()
+    if connection.vendor not in VENDORS:
+        return
+    key = 'rowid' if connection.vendor == 'sqlite' else 'incident_id'
+    with connection.cursor() as cursor:
+        for batch in chunks(ids):
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def rebuild():
+    connection = write_connection()
+    if connection.vendor not in VENDORS:
+        return 0
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(f"{'DELETE FROM' if connection.vendor == 'sqlite' else 'TRUNCATE'} {SEARCH_TABLE}")
+        reindex(connection, '1 = 1', [])
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Merge the index b-trees into one, so lookups touch fewer pages
+                cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE}')
+            return cursor.fetchone()[0]
+
+
+# === QUERIES ===
+
+def search(query, limit, after=None):
+    """
+    [(incident_id, score)] for the best ``limit`` matches, best first.
+    Lower scores rank higher; ``after`` is the (score, id) of the last row
+    of the previous page, so every page is one ranked LIMIT query with no
+    OFFSET to skip through.
+
+    Only the newest MAX_CANDIDATES matches are scored: they are taken in
+    id order straight from the index, then ranked. Older matches of a query
+    that has more than that are not returned.
+    """
+    words = terms(query)
+    if not words:
+        raise SearchError("enter at least one word to search for")
+    connection = connections[router.db_for_read(Incident)]
+    if connection.vendor not in VENDORS:
+        return fallback_search(words, limit, after)
+
+    expression = match_expression(connection.vendor, words)
+    if connection.vendor == 'sqlite':
+        # FTS5 walks its matches in rowid order, so bm25 only runs on the candidates
+        ranked = (f'SELECT rowid AS id, {SQLITE_RANK} AS score '
+                  f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s')
+        params = [expression, MAX_CANDIDATES]
+    else:
+        candidates = (f"SELECT incident_id AS id, document FROM {SEARCH_TABLE} "
+                      f"WHERE document @@ to_tsquery('english', %s) ORDER BY incident_id DESC LIMIT %s")
+        ranked = (f"SELECT id, -ts_rank_cd(document, to_tsquery('english', %s)) AS score "
+                  f"FROM ({candidates}) candidates")
+        params = [expression, expression, MAX_CANDIDATES]
+    seek = ''
+    if after is not None:
+        seek = 'WHERE score > %s OR (score = %s AND id > %s)'
+        params += [after[0], after[0], after[1]]
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id, score FROM ({ranked}) ranked {seek} ORDER BY score, id LIMIT %s',
+                       params + [limit])
+        return [(row[0], float(row[1])) for row in cursor.fetchall()]
+
+
+def truncated(query):
+    """
+    Whether ``query`` matches more incidents than the MAX_CANDIDATES that
+    search() ranks. Counts at most one match past the cap, from the index.
+    """
+    words = terms(query)
+    if not words:
+        raise SearchError("enter at least one word to search for")
+    connection = connections[router.db_for_read(Incident)]
+    if connection.vendor not in VENDORS:
+        return False  # fallback_search() pages through every match
+    expression = match_expression(connection.vendor, words)
+    if connection.vendor == 'sqlite':
+        matches = f'SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT %s'
+    else:
+        matches = f"SELECT 1 FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('english', %s) LIMIT %s"
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM ({matches}) matches', [expression, MAX_CANDIDATES + 1])
+        return cursor.fetchone()[0] > MAX_CANDIDATES
+
+
+def fallback_search(words, limit, after):
+    # Other databases: unranked substring matching, oldest id first
+    incidents = Incident.objects.all()
+    for word in words:
+        incidents = incidents.filter(
+            Q(description__icontains=word) | Q(location__name__icontains=word)
+            | Q(location__address__icontains=word) | Q(location__city__icontains=word))
+    if after is not None:
+        incidents = incidents.filter(id__gt=after[1])
+    return [(pk, 0.0) for pk in incidents.order_by('id').values_list('id', flat=True)[:limit]]
@@ -0,0 +1,145 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from fire import rollups, rosters, search, spatial
+from fire.cache import bump_version_on_commit
+from fire.models import Locations, Incident, FireStation, Firefighters, FireTruck, WeatherConditions
+
+# (city, country, latitude, longitude, weight)
+CITIES = [
+    ('Puerto Princesa', 'Philippines', 9.7392, 118.7353, 8),
+    ('Metro Manila', 'Philippines', 14.5995, 120.9842, 6),
+    ('Cebu City', 'Philippines', 10.3157, 123.8854, 4),
+    ('Davao City', 'Philippines', 7.1907, 125.4553, 3),
+    ('Jakarta', 'Indonesia', -6.2088, 106.8456, 3),
+    ('Kuala Lumpur', 'Malaysia', 3.1390, 101.6869, 2),
+    ('Ho Chi Minh City', 'Vietnam', 10.8231, 106.6297, 2),
+    ('Bangkok', 'Thailand', 13.7563, 100.5018, 2),
+]
+STREETS = ['Rizal Ave', 'Malvar St', 'Mabini St', 'Burgos St', 'Bonifacio Dr', 'Luna St', 'National Hwy']
+PLACES = ['Market', 'Warehouse', 'Residence', 'School', 'Terminal', 'Mall', 'Clinic', 'Pier', 'Farm']
+SEVERITY_WEIGHTS = [('Minor Fire', 6), ('Moderate Fire', 3), ('Major Fire', 1)]
+TRUCK_MODELS = ['Isuzu FTR', 'Hino 500', 'Mitsubishi Fuso', 'Rosenbauer AT']
+WEATHER = ['Clear', 'Sunny', 'Partly cloudy', 'Overcast', 'Light rain', 'Windy', 'Humid', 'Haze']
+DESCRIPTIONS = ['Electrical fire', 'Kitchen fire', 'Grass fire', 'Vehicle fire', 'Rubbish fire', 'Structure fire']
+BATCH_SIZE = 1000
+
+
+def coordinate(value):
+    return Decimal(f'{value:.6f}')
+
+
+class Generator:
+    """
+    Synthetic but plausible fire data. Rows are written with bulk_create,
+    so the geohashes, incident rollup, station rosters and search index that
+    the save signals normally maintain are filled in here and in seed().
+    """
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def city(self):
+        return self.random.choices(CITIES, weights=[c[4] for c in CITIES])[0]
+
+    def near(self, latitude, longitude, spread=0.08):
+        return (coordinate(latitude + self.random.uniform(-spread, spread)),
+                coordinate(longitude + self.random.uniform(-spread, spread)))
+
+    def stations(self, count):
+        stations = []
+        for n in range(count):
+            city, country, lat, lon, weight = self.city()
+            latitude, longitude = self.near(lat, lon)
+            stations.append(FireStation(
+                name=f'{city} Fire Station {n + 1}',
+                address=f'{self.random.randint(1, 999)} {self.random.choice(STREETS)}',
+                city=city, country=country, latitude=latitude, longitude=longitude,
+                geohash=spatial.geohash_for(latitude, longitude)))
+        return FireStation.objects.bulk_create(stations, batch_size=BATCH_SIZE)
+
+    def firefighters(self, stations, per_station):
+        ranks = [choice for choice, label in Firefighters.XP_CHOICES]
+        return Firefighters.objects.bulk_create([
+            Firefighters(
+                name=f'Firefighter {station.pk}-{n + 1}',
+                rank=self.random.choice(ranks),
+                experience_level=self.random.choice(ranks),
+                station=station)
+            for station in stations for n in range(per_station)
+        ], batch_size=BATCH_SIZE)
+
+    def trucks(self, stations, per_station):
+        return FireTruck.objects.bulk_create([
+            FireTruck(
+                truck_number=f'{station.pk:03d}-{n + 1}',
+                model=self.random.choice(TRUCK_MODELS),
+                capacity=self.random.choice([1000, 1500, 2000, 3000, 4000]),
+                station=station)
+            for station in stations for n in range(per_station)
+        ], batch_size=BATCH_SIZE)
+
+    def locations(self, count):
+        locations = []
+        for n in range(count):
+            city, country, lat, lon, weight = self.city()
+            latitude, longitude = self.near(lat, lon)
+            locations.append(Locations(
+                name=f'{self.random.choice(PLACES)} {n + 1}',
+                address=f'{self.random.randint(1, 999)} {self.random.choice(STREETS)}',
+                city=city, country=country, latitude=latitude, longitude=longitude,
+                geohash=spatial.geohash_for(latitude, longitude)))
+        return Locations.objects.bulk_create(locations, batch_size=BATCH_SIZE)
+
+    def incidents(self, locations, count, days=730):
+        now = timezone.now()
+        levels, weights = zip(*SEVERITY_WEIGHTS)
+        return Incident.objects.bulk_create([
+            Incident(
+                location=self.random.choice(locations),
+                date_time=now - timedelta(seconds=self.random.randint(0, days * 86400)),
+                severity_level=self.random.choices(levels, weights=weights)[0],
+                description=self.random.choice(DESCRIPTIONS))
+            for n in range(count)
+        ], batch_size=BATCH_SIZE)
+
+    def weather(self, incidents, ratio):
+        return WeatherConditions.objects.bulk_create([
+            WeatherConditions(
+                incident=incident,
+                temperature=Decimal(f'{self.random.uniform(24, 40):.2f}'),
+                humidity=Decimal(f'{self.random.uniform(40, 95):.2f}'),
+                wind_speed=Decimal(f'{self.random.uniform(0, 40):.2f}'),
+                weather_description=self.random.choice(WEATHER))
+            for incident in incidents if self.random.random() < ratio
+        ], batch_size=BATCH_SIZE)
+
+
+@transaction.atomic
+def seed(stations=10, firefighters=6, trucks=2, locations=200, incidents=1000, weather=0.5, random_seed=None):
+    """
+    Add the given volumes (firefighters and trucks are per station, weather
+    is the share of incidents with a reading) and return the row counts.
+    """
+    generator = Generator(random_seed)
+    new_stations = generator.stations(stations)
+    new_locations = generator.locations(locations)
+    new_incidents = generator.incidents(new_locations, incidents) if new_locations else []
+    counts = {
+        'stations': len(new_stations),
+        'firefighters': len(generator.firefighters(new_stations, firefighters)),
+        'trucks': len(generator.trucks(new_stations, trucks)),
+        'locations': len(new_locations),
+        'incidents': len(new_incidents),
+        'weather': len(generator.weather(new_incidents, weather)),
+    }
+    rollups.rebuild()
+    rosters.rebuild()
+    search.index_incidents([incident.pk for incident in new_incidents])
+    for model in (FireStation, Locations, Incident):
+        bump_version_on_commit(model)
+    return counts
@@ -0,0 +1,147 @@
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from fire import metrics, rollups, rosters, search, slowqueries, spatial
+from fire.cache import bump_version_on_commit
+from fire.models import Incident, Locations, FireStation, Firefighters, FireTruck, WeatherConditions, Tombstone, StationRoster
+
+
+# === GEOHASHES ===
+
+@receiver(pre_save, sender=Locations)
+@receiver(pre_save, sender=FireStation)
+def set_geohash(sender, instance, **kwargs):
+    instance.geohash = spatial.geohash_for(instance.latitude, instance.longitude)
+
+
+# === INCIDENT ROLLUPS ===
+
+@receiver(pre_save, sender=Incident)
+def remember_incident_bucket(sender, instance, raw=False, **kwargs):
+    instance._rollup_old_key = None
+    if raw or instance.pk is None:
+        return
+    old = Incident.objects.select_related('location').filter(pk=instance.pk).first()
+    if old is not None:
+        instance._rollup_old_key = rollups.rollup_key(old)
+
+@receiver(post_save, sender=Incident)
+def update_incident_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.move(getattr(instance, '_rollup_old_key', None), rollups.rollup_key(instance))
+
+@receiver(pre_delete, sender=Incident)
+def remember_deleted_incident_bucket(sender, instance, **kwargs):
+    instance._rollup_old_key = rollups.rollup_key(instance)
+
+@receiver(post_delete, sender=Incident)
+def remove_incident_from_rollup(sender, instance, **kwargs):
+    rollups.move(getattr(instance, '_rollup_old_key', None), None)
+
+@receiver(pre_save, sender=Locations)
+def remember_location_place(sender, instance, raw=False, **kwargs):
+    instance._rollup_old_place = None
+    if raw or instance.pk is None:
+        return
+    instance._rollup_old_place = (
+        Locations.objects.filter(pk=instance.pk).values_list('city', 'country').first())
+
+@receiver(post_save, sender=Locations)
+def update_location_rollups(sender, instance, raw=False, created=False, **kwargs):
+    old_place = getattr(instance, '_rollup_old_place', None)
+    if raw or created or old_place is None:
+        return
+    if old_place != (instance.city, instance.country):
+        rollups.relocate(instance, *old_place)
+
+
+# === STATION ROSTERS ===
+
+@receiver(post_save, sender=FireStation)
+def create_station_roster(sender, instance, raw=False, created=False, **kwargs):
+    if created and not raw:
+        StationRoster.objects.get_or_create(station=instance)
+
+@receiver(pre_save, sender=FireTruck)
+@receiver(pre_save, sender=Firefighters)
+def remember_roster_contribution(sender, instance, raw=False, **kwargs):
+    instance._roster_old = None
+    if raw or instance.pk is None:
+        return
+    old = sender.objects.filter(pk=instance.pk).first()
+    if old is not None:
+        instance._roster_old = rosters.contribution(old)
+
+@receiver(post_save, sender=FireTruck)
+@receiver(post_save, sender=Firefighters)
+def update_station_roster(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rosters.move([(getattr(instance, '_roster_old', None), rosters.contribution(instance))])
+
+@receiver(post_delete, sender=FireTruck)
+@receiver(post_delete, sender=Firefighters)
+def remove_from_station_roster(sender, instance, **kwargs):
+    rosters.move([(rosters.contribution(instance), None)])
+
+
+# === SEARCH INDEX ===
+
+@receiver(post_save, sender=Incident)
+def index_incident(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_incidents([instance.pk])
+
+@receiver(post_delete, sender=Incident)
+def unindex_incident(sender, instance, **kwargs):
+    search.remove_incidents([instance.pk])
+
+@receiver(post_save, sender=Locations)
+def reindex_location_incidents(sender, instance, raw=False, created=False, **kwargs):
+    if not (raw or created):
+        search.index_location(instance.pk)
+
+
+# === SYNC TOMBSTONES ===
+
+@receiver(post_delete, sender=Incident)
+@receiver(post_delete, sender=Locations)
+@receiver(post_delete, sender=FireStation)
+@receiver(post_delete, sender=Firefighters)
+@receiver(post_delete, sender=FireTruck)
+@receiver(post_delete, sender=WeatherConditions)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(model=sender._meta.model_name, object_id=instance.pk)
+
+
+# === CACHE VERSIONS ===
+# Connected after the rollup receivers so the rollup is current before
+# cached chart data is invalidated.
+
+@receiver(post_save, sender=Incident)
+@receiver(post_delete, sender=Incident)
+@receiver(post_save, sender=Locations)
+@receiver(post_delete, sender=Locations)
+@receiver(post_save, sender=FireStation)
+@receiver(post_delete, sender=FireStation)
+@receiver(post_save, sender=FireTruck)
+@receiver(post_delete, sender=FireTruck)
+@receiver(post_save, sender=Firefighters)
+@receiver(post_delete, sender=Firefighters)
+def invalidate_cached_views(sender, **kwargs):
+    bump_version_on_commit(sender)
+
+
+# === QUERY INSTRUMENTATION ===
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
+
+@receiver(request_finished)
+def save_slow_queries(sender, **kwargs):
+    slowqueries.finish_request()
@@ -0,0 +1,118 @@
+import re
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from fire import routers
+
+MAX_SQL_LENGTH = 10000
+MAX_PARAMS_LENGTH = 2000
+EXPLAINABLE = re.compile(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+# Whole-table scans: SQLite "SCAN <table>" without an index, PostgreSQL "Seq Scan"
+FULL_SCAN = re.compile(r'^\s*SCAN (?!.*\bUSING\b)|Seq Scan', re.MULTILINE)
+
+MAX_PENDING = 1000
+
+# Captured queries waiting to be explained and saved, per request (set by
+# MetricsMiddleware) or, outside requests, per thread or task. A request's
+# are saved once it is finished, after its response has been sent; others
+# as soon as the default connection is outside a transaction, so a rollback
+# cannot lose them and a write transaction is not made longer.
+pending = ContextVar('fire_slow_queries', default=None)
+in_request = ContextVar('fire_slow_queries_in_request', default=False)
+# Set while the recorder runs its own EXPLAIN or INSERT, so those are not
+# captured in turn.
+busy = ContextVar('fire_slow_query_busy', default=False)
+
+
+def start_request():
+    # A fresh queue for the request about to be served
+    pending.set(deque(maxlen=MAX_PENDING))
+    in_request.set(True)
+
+
+def finish_request():
+    # The response has been sent: save what the request captured
+    in_request.set(False)
+    flush()
+    pending.set(None)
+
+
+def queue():
+    captured = pending.get()
+    if captured is None:
+        captured = deque(maxlen=MAX_PENDING)
+        pending.set(captured)
+    return captured
+
+
+def threshold():
+    # Seconds, or None when recording is off (SLOW_QUERY_MS = None)
+    ms = getattr(settings, 'SLOW_QUERY_MS', None)
+    return None if ms is None else ms / 1000
+
+
+def explain(connection, sql, params):
+    if not EXPLAINABLE.match(sql):
+        return ''
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except (DatabaseError, TypeError, ValueError) as e:
+        return f'(no plan: {e})'
+
+
+def capture(connection, sql, params, many, seconds, view=''):
+    # The query is only queued here: its EXPLAIN runs when it is saved
+    if busy.get():
+        return
+    queue().append({
+        'database': connection.alias,
+        'view': view or '',
+        'duration_ms': round(seconds * 1000, 3),
+        'sql': sql,
+        'params': params,
+        'many': many,
+    })
+    if not in_request.get():
+        flush()
+
+
+def flush():
+    """
+    Explain and save the pending captures, then trim the table to
+    SLOW_QUERY_LIMIT rows. Each EXPLAIN is one more query on the captured
+    query's database, run after the request that was slow; recording is
+    off unless SLOW_QUERY_MS is set.
+    """
+    from fire.models import SlowQuery
+
+    captured = pending.get()
+    if not captured or busy.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return
+    token = busy.set(True)
+    try:
+        rows = []
+        while captured:
+            entry = captured.popleft()
+            plan = '' if entry['many'] else explain(connections[entry['database']], entry['sql'], entry['params'])
+            rows.append(SlowQuery(
+                sql=entry['sql'][:MAX_SQL_LENGTH],
+                params=repr(entry['params'])[:MAX_PARAMS_LENGTH],
+                plan=plan,
+                full_scan=bool(FULL_SCAN.search(plan)),
+                **{name: entry[name] for name in ('database', 'view', 'duration_ms')},
+            ))
+        with routers.primary():
+            SlowQuery.objects.bulk_create(rows)
+            limit = getattr(settings, 'SLOW_QUERY_LIMIT', 1000)
+            oldest_kept = list(SlowQuery.objects.order_by('-id').values_list('id', flat=True)[limit - 1:limit])
+            if oldest_kept:
+                SlowQuery.objects.filter(id__lt=oldest_kept[0]).delete()
+    except DatabaseError:
+        pass  # recording must never break the request
+    finally:
+        busy.reset(token)
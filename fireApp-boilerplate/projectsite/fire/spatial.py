@@ -0,0 +1,198 @@
+import heapq
+import math
+import threading
+
+from django.db.models import Q
+
+from fire.cache import cacheable_reads, model_versions
+from fire.models import FireStation
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python distance math
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 12
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+# === GEOHASH ===
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return ''
+    return geohash_encode(float(latitude), float(longitude))
+
+
+def cell_size(precision):
+    # (height, width) in degrees of a geohash cell
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle: the center cell
+    and its eight neighbours, at the finest precision whose cells are still
+    at least as large as the radius.
+    """
+    dlat = radius_km / 111.32
+    dlon = radius_km / (111.32 * max(math.cos(math.radians(latitude)), 0.01))
+    precision = 0
+    while precision < GEOHASH_PRECISION:
+        height, width = cell_size(precision + 1)
+        if height < dlat or width < dlon:
+            break
+        precision += 1
+    if precision == 0:
+        return ['']
+    height, width = cell_size(precision)
+    prefixes = set()
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            lat = max(-90.0, min(90.0, latitude + i * height))
+            lon = (longitude + j * width + 180.0) % 360.0 - 180.0
+            prefixes.add(geohash_encode(lat, lon, precision))
+    return sorted(prefixes)
+
+
+def geohash_prefix_q(prefixes, field='geohash'):
+    # Range lookups rather than LIKE so the database can seek the index
+    q = Q()
+    for prefix in prefixes:
+        if not prefix:
+            return Q()
+        q |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '~'})
+    return q
+
+
+# === DISTANCES ===
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distances from one point to many. ``latitudes`` and
+    ``longitudes`` are in radians (numpy arrays when numpy is installed).
+    """
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    if np is not None:
+        a = (np.sin((latitudes - lat) / 2) ** 2
+             + math.cos(lat) * np.cos(latitudes) * np.sin((longitudes - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    cos_lat = math.cos(lat)
+    return [
+        2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0,
+            math.sin((la - lat) / 2) ** 2 + cos_lat * math.cos(la) * math.sin((lo - lon) / 2) ** 2)))
+        for la, lo in zip(latitudes, longitudes)
+    ]
+
+
+def to_radians(values):
+    if np is not None:
+        return np.radians(np.asarray(values, dtype=float))
+    return [math.radians(v) for v in values]
+
+
+# === STATION INDEX ===
+
+class StationIndex:
+    """
+    All station coordinates held in memory as radian arrays, so a nearest-K
+    query is one vectorized distance pass instead of a table scan. Built
+    from a single query and rebuilt whenever the FireStation cache version
+    changes.
+    """
+    _lock = threading.Lock()
+    _current = None
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.ids = [pk for pk, lat, lon in rows]
+        self.latitudes = to_radians([float(lat) for pk, lat, lon in rows])
+        self.longitudes = to_radians([float(lon) for pk, lat, lon in rows])
+
+    @classmethod
+    def build(cls, version=None):
+        rows = (FireStation.objects
+                .filter(latitude__isnull=False, longitude__isnull=False)
+                .values_list('id', 'latitude', 'longitude'))
+        return cls(list(rows), version)
+
+    @classmethod
+    def current(cls):
+        version = model_versions(FireStation)[0]
+        index = cls._current
+        if index is None or index.version != version:
+            with cls._lock:
+                index = cls._current
+                if index is None or index.version != version:
+                    with cacheable_reads(FireStation):
+                        index = cls._current = cls.build(version)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distances(self, latitude, longitude):
+        return haversine_km(latitude, longitude, self.latitudes, self.longitudes)
+
+    def nearest(self, latitude, longitude, k):
+        # [(station_id, distance_km)] for the k closest stations
+        if not self.ids or k <= 0:
+            return []
+        distances = self.distances(latitude, longitude)
+        if np is not None:
+            k = min(k, len(self.ids))
+            candidates = np.argpartition(distances, k - 1)[:k]
+            order = candidates[np.argsort(distances[candidates])]
+            return [(self.ids[i], float(distances[i])) for i in order]
+        return heapq.nsmallest(k, zip(self.ids, distances), key=lambda pair: pair[1])
+
+
+def nearest_stations(latitude, longitude, k=5):
+    return StationIndex.current().nearest(latitude, longitude, k)
+
+
+def stations_within(latitude, longitude, radius_km):
+    """
+    [(station_id, distance_km)] for stations inside the radius, nearest
+    first. Candidates come from the indexed geohash column, so only the
+    stations in the few cells around the point are read.
+    """
+    rows = list(FireStation.objects
+                .filter(geohash_prefix_q(covering_prefixes(latitude, longitude, radius_km)))
+                .filter(latitude__isnull=False, longitude__isnull=False)
+                .values_list('id', 'latitude', 'longitude'))
+    if not rows:
+        return []
+    distances = haversine_km(
+        latitude, longitude,
+        to_radians([float(lat) for pk, lat, lon in rows]),
+        to_radians([float(lon) for pk, lat, lon in rows]))
+    found = [(pk, float(d)) for (pk, lat, lon), d in zip(rows, distances) if d <= radius_km]
+    return sorted(found, key=lambda pair: pair[1])
@@ -0,0 +1,139 @@
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from fire.models import (Locations, Incident, FireStation, Firefighters, FireTruck, WeatherConditions, Tombstone,
+                         TombstonePrune)
+from fire.pagination import decode_position, encode_position
+
+SYNC_MODELS = {
+    model._meta.model_name: model
+    for model in (Locations, Incident, FireStation, Firefighters, FireTruck, WeatherConditions)
+}
+TOMBSTONES = 'tombstone'
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+# Rows are only handed out once they are this old, so a transaction that
+# commits a little after a later one cannot slip in behind a cursor.
+SETTLE_SECONDS = 1
+
+
+class CursorExpired(ValueError):
+    pass
+
+
+def retention_horizon():
+    return timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+
+
+def pruned_horizon():
+    # Newest tombstone deleted so far, or None when none ever were
+    return TombstonePrune.objects.order_by('-horizon').values_list('horizon', flat=True).first()
+
+
+def parse_cursor(token):
+    """
+    (updated_at, source, id, synced), or None to sync from the beginning.
+
+    The first three are the last change handed out. ``synced`` is the time
+    the client is known to be complete up to: once a page has been read to
+    the end, or since a sync from the beginning started, that is later than
+    the last change, and a quiet table would otherwise never get ahead of
+    its pruned tombstones.
+    """
+    if not token:
+        return None
+    moment, keys = decode_position(token)
+    try:
+        source, pk, *synced = keys
+        pk = int(pk)
+        # Cursors issued before ``synced`` was added are complete up to their last change
+        synced = parse_datetime(*synced) if synced else moment
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor {token!r}")
+    if synced is None or (source != TOMBSTONES and source not in SYNC_MODELS):
+        raise ValueError(f"Invalid cursor {token!r}")
+    # Expired only once a delete the client may not have seen has been pruned
+    horizon = pruned_horizon()
+    if horizon is not None and synced < horizon:
+        raise CursorExpired("deletes after this cursor have been pruned; sync again from the start")
+    return moment, source, pk, synced
+
+
+def after(queryset, source, cursor):
+    # Rows of one source that sort after the cursor on (updated_at, source, id)
+    if cursor is None:
+        return queryset
+    updated_at, cursor_source, pk, synced = cursor
+    if source > cursor_source:
+        return queryset.filter(updated_at__gte=updated_at)
+    if source == cursor_source:
+        return queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+    return queryset.filter(updated_at__gt=updated_at)
+
+
+def sources(model_name=None):
+    if model_name is None:
+        models, tombstones = SYNC_MODELS, Tombstone.objects.all()
+    else:
+        models, tombstones = {model_name: SYNC_MODELS[model_name]}, Tombstone.objects.filter(model=model_name)
+    return [(name, model.objects.all()) for name, model in models.items()] + [(TOMBSTONES, tombstones)]
+
+
+def change(source, row):
+    if source == TOMBSTONES:
+        return {'model': row['model'], 'op': 'delete', 'id': row['object_id']}
+    return {'model': source, 'op': 'upsert', 'id': row['id'], 'data': row}
+
+
+def changes(cursor=None, model_name=None, limit=DEFAULT_LIMIT):
+    """
+    Up to ``limit`` upserts and deletes after ``cursor``, oldest first, with
+    the cursor to continue from and whether more are waiting.
+
+    Every source (each model table and the tombstones) is read with one seek
+    on its updated_at index, limited to ``limit + 1`` rows, and the results
+    are merged on (updated_at, source, id). A sync therefore costs time in
+    proportion to the changes, not to the table sizes.
+    """
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    streams = []
+    for source, queryset in sources(model_name):
+        rows = (after(queryset, source, cursor)
+                .filter(updated_at__lte=settled)
+                .order_by('updated_at', 'id')
+                .values()[:limit + 1])
+        streams.append([(row['updated_at'], source, row['id'], row) for row in rows])
+
+    merged = list(heapq.merge(*streams, key=lambda item: item[:3]))
+    page, more = merged[:limit], len(merged) > limit
+    position = page[-1][:3] if page else cursor and cursor[:3]
+    if not position:
+        next_cursor = None
+    else:
+        # Complete up to the settle time when nothing is left; otherwise up
+        # to the last change, or the start of a sync from the beginning
+        synced = max(cursor[3] if cursor else settled, position[0]) if more else settled
+        next_cursor = encode_position(*position, synced.isoformat())
+    return [change(source, row) for updated_at, source, pk, row in page], next_cursor, more
+
+
+def prune_tombstones(before=None):
+    """
+    Delete the tombstones last changed before ``before`` (default: the
+    retention period ago) and record the newest of them, which expires every
+    cursor that could still need one.
+    """
+    pruned = Tombstone.objects.filter(updated_at__lt=before or retention_horizon())
+    with transaction.atomic():
+        horizon = pruned.aggregate(horizon=Max('updated_at'))['horizon']
+        if horizon is None:
+            return 0
+        deleted = pruned.filter(updated_at__lte=horizon).delete()[0]
+        TombstonePrune.objects.create(horizon=horizon, deleted=deleted)
+    return deleted
@@ -1,3 +1,1052 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import math
+import os
+import random
+import runpy
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.utils import load_backend
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+
+from fire import (admin as fire_admin, aio, async_views, charts, clustering, compression, exports, geojson, live, middleware,
+                  pagination, rollups, rosters, routers, search, seed, slowqueries, spatial, sync, weather)
+from fire.cache import bump_version
+from fire.models import (FireStation, Firefighters, FireTruck, Incident, IncidentDailyRollup, Locations, SlowQuery,
+                         StationRoster, Tombstone, WeatherConditions, WeatherReading)
+from fire.backends.sqlite3 import base as sqlite_backend
+from projectsite import settings as project_settings, urls
+
+# Base volumes, multiplied by each scale. FIRE_BENCHMARK_SCALES=1,10,100
+# runs bigger sizes; FIRE_BENCHMARK=1 prints the timings.
+BASE_VOLUMES = {'stations': 4, 'locations': 20, 'incidents': 100}
+SCALES = [int(scale) for scale in os.environ.get('FIRE_BENCHMARK_SCALES', '1,4').split(',')]
+
+# Query string for the routes that need one
+PARAMS = {
+    'api/incidents/clusters.json': {'zoom': 5, 'bbox': '100,-10,130,20'},
+    'api/stations/nearest': {'lat': 9.74, 'lon': 118.74, 'k': 5},
+    'api/stations/within': {'lat': 9.74, 'lon': 118.74, 'radius_km': 50},
+    'api/incidents/search': {'q': 'kitchen fire'},
+    'incident_list/search/': {'q': 'market'},
+    'api/autocomplete/<str:source>': {'q': 'kitchen'},
+}
+
+
+def post_bodies(scale):
+    # JSON bodies for the routes that only take POST
+    incident, location, severity = Incident.objects.order_by('pk').values_list('pk', 'location', 'severity_level').first()
+    levels = [level for level, label in Incident.SEVERITY_CHOICES]
+    start = timezone.now() - timedelta(hours=scale)  # new readings and buckets at every scale
+    return {
+        'api/bulk/<str:model>': {'items': [
+            {'id': incident, 'description': f'Updated at scale {scale}',
+             'severity_level': levels[(levels.index(severity) + 1) % 3]},  # moves it out of its bucket
+            *({'location': location, 'date_time': (start - timedelta(days=n * scale)).isoformat(),
+               'severity_level': levels[n % 3], 'description': f'Bulk incident {n}'}
+              for n in range(20)),
+        ]},
+        'api/weather/readings': {'readings': [
+            {'incident': incident, 'time': (start + timedelta(minutes=n)).isoformat(),
+             'temperature': 30 + n % 5, 'humidity': 60, 'wind_speed': n % 12}
+            for n in range(60)
+        ]},
+    }
+
+# Queries per request with a cold cache. Every count must also stay the
+# same at every scale: growth with the data is an N+1.
+QUERY_BUDGETS = {
+    'metrics': 0,
+    '': 1,
+    'dashboard_chart': 0,
+    'chart/': 1,
+    'lineChart/': 1,
+    'multilineChart/': 2,
+    'multiBarChart/': 1,
+    'dashboard/data': 8,
+    'stations': 0,
+    'incidents': 1,
+    'api/incidents.geojson': 1,
+    'api/incidents/clusters.json': 12,  # one per tile, six tiles
+    'api/incidents/live': 2,
+    'api/incidents.csv': 2,  # incidents, then their weather readings
+    'api/incidents.ndjson': 2,
+    'api/sync': 7,
+    'api/sync/<str:model>': 2,
+    'api/incidents/search': 3,  # matches, their incidents and whether more were left out
+    'api/incidents/<int:pk>/weather': 1,
+    'api/weather/readings': 5,
+    'api/bulk/<str:model>': 13,  # whatever the batch size: lookups, two writes, rollup and search index
+    'api/incidents/<int:pk>/dispatch': 5,
+    'api/autocomplete/<str:source>': 2,
+    'api/stations.geojson': 1,
+    'api/stations/nearest': 2,
+    'api/stations/within': 2,
+    'locations_list/': 1,
+    'locations_list/add/': 0,
+    'locations_list/<int:pk>/': 1,
+    'locations_list/<int:pk>/delete/': 1,
+    'incident_list/': 1,
+    'incident_list/search/': 2,
+    'incident_list/add/': 0,
+    'incident_list/<int:pk>/': 2,
+    'incident_list/<int:pk>/delete/': 1,
+    'incident_list/<int:pk>/dispatch/': 5,
+    'firestations/': 1,
+    'firestations/add/': 0,
+    'firestations/<int:pk>/edit/': 1,
+    'firestations/<int:pk>/delete/': 1,
+    'firefighter_list/': 1,
+    'firefighter_list/add/': 0,
+    'firefighter_list/<int:pk>/': 2,
+    'firefighter_list/<int:pk>/delete/': 1,
+    'firetrucks/': 1,
+    'firetrucks/add/': 0,
+    'firetrucks/<int:pk>/edit/': 2,
+    'firetrucks/<int:pk>/delete/': 2,
+    'weatherconditions/': 1,
+    'weatherconditions/add/': 0,
+    'weatherconditions/<int:pk>/edit/': 2,
+    'weatherconditions/<int:pk>/delete/': 2,
+}
+
+
+def routes():
+    # (route, url) for every page in projectsite/urls.py except the admin
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        route = str(pattern.pattern)
+        url = '/' + route
+        if '<int:pk>' in route:
+            view_class = getattr(pattern.callback, 'view_class', None)
+            model = view_class.model if view_class else Incident  # the function views take an incident
+            url = url.replace('<int:pk>', str(model.objects.order_by('pk').values_list('pk', flat=True).first()))
+        url = url.replace('<str:model>', 'incident').replace('<str:source>', 'incidents')
+        yield route, url
+
+
+def assertRollupRebuilt(test):
+    # The maintained rollup matches one rebuilt from scratch. Emptied
+    # buckets stay behind at 0 until the next rebuild.
+    def rows():
+        return list(IncidentDailyRollup.objects.filter(count__gt=0)
+                    .order_by('day', 'severity_level', 'country', 'city')
+                    .values_list('day', 'severity_level', 'country', 'city', 'count'))
+    maintained = rows()
+    rollups.rebuild()
+    test.assertEqual(maintained, rows())
+
+
+class SeededTestCase(TestCase):
+    """Tests that run against one seeding of BASE_VOLUMES."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(random_seed=1, **BASE_VOLUMES)
+
+    def setUp(self):
+        # Cache versions are bumped on commit, which never comes inside a
+        # TestCase, so results cached by an earlier test would be served
+        cache.clear()
+
+
+class ViewBenchmarkTests(TestCase):
+    """
+    Every view at several data sizes: query counts must stay within budget
+    and must not grow with the data.
+    """
+
+    def measure(self, url, params, body=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if body is None:
+                response = self.client.get(url, params)
+            else:
+                response = self.client.post(url, json.dumps(body), content_type='application/json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        self.assertLess(response.status_code, 400, url)
+        return len(queries), elapsed
+
+    @mock.patch.object(live, 'LONG_POLL_SECONDS', 0)
+    def test_query_budgets(self):
+        results = {}
+        seeded = 0
+        for scale in SCALES:
+            seed.seed(random_seed=scale, **{name: volume * (scale - seeded) for name, volume in BASE_VOLUMES.items()})
+            seeded = scale
+            bodies = post_bodies(scale)
+            results[scale] = {route: self.measure(url, PARAMS.get(route), bodies.get(route))
+                              for route, url in routes()}
+
+        for route in results[SCALES[0]]:
+            counts = [results[scale][route][0] for scale in SCALES]
+            with self.subTest(route=route):
+                self.assertIn(route, QUERY_BUDGETS, f"no query budget for {route!r}")
+                self.assertLessEqual(max(counts), QUERY_BUDGETS[route])
+                self.assertEqual(len(set(counts)), 1, f"query count grows with the data: {counts}")
+
+        if os.environ.get('FIRE_BENCHMARK'):
+            print(f"\n{'route':<36}" + ''.join(f"{f'x{scale} ms':>12}" for scale in SCALES) + f"{'queries':>9}")
+            for route in results[SCALES[0]]:
+                timings = ''.join(f"{results[scale][route][1] * 1000:>12.1f}" for scale in SCALES)
+                print(f"{route:<36}{timings}{results[SCALES[-1]][route][0]:>9}")
+
+
+class ImportIncidentsTests(TestCase):
+
+    def test_bad_records_are_skipped(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write('[1, 2]\n"x"\n3\nnot json\n'
+                    '{"location_name": "Market", "city": "Puerto Princesa", "country": "PH", '
+                    '"severity_level": "Minor Fire"}\n')
+        self.addCleanup(os.remove, f.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_incidents', f.name, stdout=out, stderr=err)
+        self.assertEqual(Incident.objects.count(), 1)
+        self.assertIn('Imported 1 incidents (1 new locations, 4 skipped)', out.getvalue())
+        self.assertIn('record 1: expected a JSON object, got list', err.getvalue())
+        assertRollupRebuilt(self)
+
+
+class RollupTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.incident = Incident.objects.order_by('pk').first()
+        cls.other = Locations.objects.exclude(city=cls.incident.location.city).order_by('pk').first()
+
+    def test_create(self):
+        Incident.objects.create(location=self.other, date_time=timezone.now(), severity_level='Major Fire',
+                                description='Warehouse blaze')
+        assertRollupRebuilt(self)
+
+    def test_severity_change(self):
+        levels = [level for level, label in Incident.SEVERITY_CHOICES]
+        self.incident.severity_level = levels[(levels.index(self.incident.severity_level) + 1) % len(levels)]
+        self.incident.save()
+        assertRollupRebuilt(self)
+
+    def test_date_change(self):
+        self.incident.date_time -= timedelta(days=40)
+        self.incident.save()
+        assertRollupRebuilt(self)
+        self.incident.date_time = None
+        self.incident.save()
+        assertRollupRebuilt(self)
+
+    def test_moved_to_another_location(self):
+        self.incident.location = self.other
+        self.incident.save()
+        assertRollupRebuilt(self)
+
+    def test_location_renamed(self):
+        location = self.incident.location
+        location.city, location.country = 'New Town', 'Elsewhere'
+        location.save()
+        assertRollupRebuilt(self)
+
+    def test_delete(self):
+        self.incident.delete()
+        assertRollupRebuilt(self)
+        self.other.delete()  # with its incidents
+        assertRollupRebuilt(self)
+
+
+class ChartCacheTests(SeededTestCase):
+
+    def new_incident(self):
+        Incident.objects.create(location=Locations.objects.order_by('pk').first(), date_time=timezone.now(),
+                                severity_level='Major Fire', description='Warehouse blaze')
+
+    def test_a_committed_write_invalidates_cached_results(self):
+        counts = charts.severity_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.new_incident()
+        with self.assertNumQueries(1):
+            self.assertEqual(charts.severity_counts()['Major Fire'], counts.get('Major Fire', 0) + 1)
+
+    def test_a_rolled_back_write_leaves_them_cached(self):
+        counts = charts.severity_counts()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.new_incident()
+                    raise RuntimeError
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            self.assertEqual(charts.severity_counts(), counts)
+
+
+class DashboardTests(SeededTestCase):
+
+    def get(self, **headers):
+        return self.client.get('/dashboard/data', headers=headers)
+
+    def test_a_matching_etag_is_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_writes_change_the_etag(self):
+        etag = self.get()['ETag']
+        incident = Incident.objects.order_by('pk').first()
+        incident.description = 'Updated'
+        incident.save()
+        self.assertNotEqual(self.get()['ETag'], etag)
+        etag = self.get()['ETag']
+        incident.delete()
+        self.assertNotEqual(self.get()['ETag'], etag)
+        self.assertEqual(self.get(**{'If-None-Match': etag}).status_code, 200)
+
+    def test_gzip_when_accepted(self):
+        plain = self.get()
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = self.get(**{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        # The weakened ETag of a compressed body still matches
+        self.assertEqual(self.get(**{'Accept-Encoding': 'gzip', 'If-None-Match': response['ETag']}).status_code, 304)
+
+    @skipUnless(compression.brotli, "brotli is not installed")
+    def test_brotli_when_accepted(self):
+        plain = self.get()
+        response = self.get(**{'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(compression.brotli.decompress(response.content), plain.content)
+
+
+def brute_force_km(latitude, longitude):
+    # {station_id: haversine distance} over every located station
+    distances = {}
+    for pk, lat, lon in FireStation.objects.filter(latitude__isnull=False, longitude__isnull=False) \
+            .values_list('id', 'latitude', 'longitude'):
+        lat1, lon1, lat2, lon2 = map(math.radians, (latitude, longitude, float(lat), float(lon)))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        distances[pk] = 2 * spatial.EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    return distances
+
+
+class SpatialTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Stations scattered around (0, 0), where geohash cells meet at every precision
+        rng = random.Random(7)
+        for n in range(60):
+            FireStation.objects.create(name=f'Edge {n}', address='-', city='-', country='-',
+                                       latitude=round(rng.uniform(-0.5, 0.5), 6),
+                                       longitude=round(rng.uniform(-0.5, 0.5), 6))
+
+    def assertMatchesBruteForce(self):
+        for latitude, longitude in ((0.0001, -0.0002), (-0.2, 0.3), (9.74, 118.74)):
+            distances = brute_force_km(latitude, longitude)
+            for radius in (1, 5, 15, 40, 100):
+                with self.subTest(point=(latitude, longitude), radius=radius):
+                    found = spatial.stations_within(latitude, longitude, radius)
+                    self.assertEqual([pk for pk, d in found],
+                                     sorted((pk for pk, d in distances.items() if d <= radius), key=distances.get))
+                    for pk, d in found:
+                        self.assertAlmostEqual(d, distances[pk], places=6)
+            for k in (1, 5, len(distances) + 10):
+                with self.subTest(point=(latitude, longitude), k=k):
+                    nearest = spatial.nearest_stations(latitude, longitude, k)
+                    self.assertEqual([pk for pk, d in nearest], sorted(distances, key=distances.get)[:k])
+
+    def test_the_covering_cells_straddle_their_edges(self):
+        prefixes = spatial.covering_prefixes(0.0001, -0.0002, 5)
+        self.assertGreater(len({prefix[0] for prefix in prefixes}), 1)
+
+    def test_results_match_a_brute_force_search(self):
+        self.assertMatchesBruteForce()
+
+    def test_results_match_without_numpy(self):
+        with mock.patch.object(spatial, 'np', None), mock.patch.object(spatial.StationIndex, '_current', None):
+            self.assertMatchesBruteForce()
+
+
+class GeoJSONTests(SeededTestCase):
+
+    def test_bad_filters_are_rejected(self):
+        for url, params in (('/api/incidents.geojson', {'start': '2024-02-30'}),
+                            ('/api/incidents.geojson', {'start': '2024-13-45'}),
+                            ('/api/incidents.geojson', {'end': '2024-01-01T25:00'}),
+                            ('/api/incidents.geojson', {'start': 'yesterday'}),
+                            ('/api/incidents.geojson', {'bbox': 'nan,0,10,10'}),
+                            ('/api/incidents.geojson', {'bbox': '0,0,inf,10'}),
+                            ('/api/stations.geojson', {'bbox': '-inf,0,10,10'})):
+            with self.subTest(url=url, params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_filters_select_the_matching_incidents(self):
+        days = sorted(timezone.localdate(moment) for moment in Incident.objects.values_list('date_time', flat=True))
+        start, end = days[len(days) // 4], days[len(days) // 2]
+        params = {'start': start.isoformat(), 'end': end.isoformat(), 'severity': 'Minor Fire,Major Fire'}
+        response = self.client.get('/api/incidents.geojson', params)
+        found = {feature['properties']['id'] for feature in json.loads(b''.join(response.streaming_content))['features']}
+        expected = set(Incident.objects.filter(date_time__date__range=(start, end),
+                                               severity_level__in=['Minor Fire', 'Major Fire'],
+                                               location__latitude__isnull=False, location__longitude__isnull=False)
+                       .values_list('pk', flat=True))
+        self.assertTrue(expected)
+        self.assertEqual(found, expected)
+
+
+class ClusterTests(SeededTestCase):
+
+    def total(self, zoom, **params):
+        response = self.client.get('/api/incidents/clusters.json', {'zoom': zoom, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return sum(cluster['count'] for cluster in response.json()['clusters'])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'zoom': 'x'}, {'zoom': -1}, {'zoom': clustering.MAX_ZOOM + 1},
+                       {'zoom': 5, 'start': '2024-02-30'}, {'zoom': 5, 'end': '2024-01-01T25:00'},
+                       {'zoom': 5, 'bbox': '0,0,nan,10'}, {'zoom': 5, 'bbox': '10,0,0,10'},
+                       {'zoom': 5, 'severity': 'Inferno'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/incidents/clusters.json', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_too_many_tiles_are_rejected(self):
+        response = self.client.get('/api/incidents/clusters.json', {'zoom': 10})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('too many tiles', response.json()['error'])
+
+    def test_every_incident_is_counted_once_at_every_zoom(self):
+        # On the corner shared by all four zoom 1 tiles
+        corner = Locations.objects.create(name='Corner', address='-', city='Null Island', country='-',
+                                          latitude=0, longitude=0)
+        Incident.objects.create(location=corner, severity_level='Minor Fire', description='On the edge')
+        located = Incident.objects.filter(location__latitude__isnull=False, location__longitude__isnull=False)
+        for zoom in (0, 1, 2):
+            with self.subTest(zoom=zoom):
+                self.assertEqual(self.total(zoom), located.count())
+        self.assertEqual(self.total(1, severity='Minor Fire'), located.filter(severity_level='Minor Fire').count())
+
+
+class ExportTests(SeededTestCase):
+
+    def test_rows_match_the_left_join(self):
+        first, last = Incident.objects.order_by('id')[0], Incident.objects.order_by('-id')[0]
+        for temperature in (31, 33):
+            WeatherConditions.objects.create(incident=first, temperature=temperature, humidity=70,
+                                             wind_speed=5, weather_description='Cloudy')
+        last.weatherconditions_set.all().delete()
+        exported = list(exports.export_rows({}))
+        joined = list(Incident.objects
+                      .order_by('id', 'weatherconditions__id')
+                      .values_list(*exports.INCIDENT_FIELDS.values(), *(f'weatherconditions__{path}' for path in exports.WEATHER_FIELDS.values())))
+        self.assertEqual(exported, joined)
+        self.assertEqual(exported[-1][len(exports.INCIDENT_FIELDS):], (None,) * len(exports.WEATHER_FIELDS))
+
+    def test_bad_filters_are_rejected(self):
+        for fmt in ('csv', 'ndjson'):
+            for params in ({'start': '2024-02-30'}, {'end': '2024-13-45'}, {'bbox': 'inf,0,10,10'}):
+                with self.subTest(fmt=fmt, params=params):
+                    response = self.client.get(f'/api/incidents.{fmt}', params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('error', response.json())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+
+    def test_db_for_write_does_not_pin_reads(self):
+        router = routers.PrimaryReplicaRouter()
+        with routers.replica():
+            self.assertEqual(router.db_for_write(Incident), 'default')
+            self.assertEqual(router.db_for_read(Incident), 'replica')
+
+    def test_requests_that_may_write_read_from_the_primary(self):
+        seen = {}
+
+        def view(request):
+            with routers.replica():
+                seen[request.method] = routers.PrimaryReplicaRouter().db_for_read(Incident)
+            return HttpResponse()
+
+        pinning = middleware.ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+        pinning(factory.get('/'))
+        response = pinning(factory.post('/'))
+        self.assertEqual(seen, {'GET': 'replica', 'POST': 'default'})
+        self.assertIn(middleware.PIN_COOKIE, response.cookies)
+
+
+    def test_cached_results_are_computed_on_the_replica_once_it_has_caught_up(self):
+        aliases = []
+        choose = routers.PrimaryReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            aliases.append(choose(router, model, **hints))
+            return 'default'  # "replica" is only a name here
+
+        with mock.patch.object(routers.PrimaryReplicaRouter, 'db_for_read', db_for_read):
+            for url in ('/chart/', '/api/stations/nearest'):
+                for changed, expected in ((False, {'replica'}), (True, {'default'})):
+                    with self.subTest(url=url, changed=changed):
+                        cache.clear()
+                        if changed:
+                            bump_version(Incident)
+                            bump_version(FireStation)
+                        aliases.clear()
+                        self.client.get(url, PARAMS.get(url[1:]))
+                        self.assertEqual(set(aliases), expected)
+
+
+class ASYNC_URLCONF:
+    # projectsite/urls.py with the async views swapped in, as FIRE_ASYNC_VIEWS does
+    urlpatterns = [
+        URLPattern(pattern.pattern, getattr(async_views, pattern.callback.__name__), pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and hasattr(async_views, pattern.callback.__name__) else pattern
+        for pattern in urls.urlpatterns
+    ]
+ASYNC_ROUTES = [str(pattern.pattern) for pattern in ASYNC_URLCONF.urlpatterns
+                if isinstance(pattern, URLPattern) and pattern.callback.__module__ == async_views.__name__
+                and pattern.callback.__name__ != 'incident_feed']
+
+
+class AsyncViewTests(SeededTestCase):
+    """The async views answer exactly what their sync counterparts do."""
+
+    async def body(self, response):
+        if not response.streaming:
+            return response.content
+        if response.is_async:
+            return b''.join([chunk async for chunk in response.streaming_content])
+        return await sync_to_async(b''.join)(response.streaming_content)
+
+    async def test_async_views_match_sync_views(self):
+        self.assertIn('dashboard/data', ASYNC_ROUTES)
+        for route in ASYNC_ROUTES:
+            with self.subTest(route=route):
+                await sync_to_async(cache.clear)()
+                expected = await sync_to_async(self.client.get)('/' + route, PARAMS.get(route))
+                with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+                    await sync_to_async(cache.clear)()
+                    response = await self.async_client.get('/' + route, PARAMS.get(route))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(await self.body(response), await self.body(expected))
+
+    async def test_dashboard_etag(self):
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            response = await self.async_client.get('/dashboard/data')
+            again = await self.async_client.get('/dashboard/data', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+
+class ConcurrentReadTests(TransactionTestCase):
+    """aio.run_concurrently() outside a transaction, where it fans out."""
+
+    def setUp(self):
+        seed.seed(random_seed=1, **BASE_VOLUMES)
+        cache.clear()
+
+    async def test_reads_run_side_by_side_on_their_own_connections(self):
+        both_running = threading.Barrier(2, timeout=5)
+
+        def read():
+            both_running.wait()  # broken, and raising, unless the other call runs meanwhile
+            return threading.get_ident(), routers.use_replica.get(), Incident.objects.count()
+
+        with routers.replica():
+            results = await aio.run_concurrently((read,), (read,))
+        self.assertEqual(len({thread for thread, hint, count in results}), 2)
+        total = await Incident.objects.acount()
+        self.assertEqual([(hint, count) for thread, hint, count in results], [(True, total)] * 2)
+
+    async def test_views_answer_as_their_sync_counterparts(self):
+        for route in ('dashboard/data', 'api/incidents/clusters.json'):
+            with self.subTest(route=route):
+                await sync_to_async(cache.clear)()
+                expected = await sync_to_async(self.client.get)('/' + route, PARAMS.get(route))
+                with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+                    await sync_to_async(cache.clear)()
+                    response = await self.async_client.get('/' + route, PARAMS.get(route))
+                self.assertEqual(response.content, expected.content)
+
+
+@mock.patch.object(live, 'SETTLE_SECONDS', 0)
+@mock.patch.object(live, 'POLL_SECONDS', 0.01)
+@mock.patch.object(live, 'LONG_POLL_SECONDS', 0.05)
+class IncidentFeedLongPollTests(SeededTestCase):
+
+    def poll(self, **params):
+        response = self.client.get('/api/incidents/live', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_times_out_without_changes(self):
+        result = self.poll()
+        self.assertEqual(result['events'], [])
+        self.assertEqual(self.poll(after=result['cursor'])['events'], [])
+
+    def test_returns_changed_incidents_after_the_cursor(self):
+        cursor = self.poll()['cursor']
+        incident = Incident.objects.filter(location__latitude__isnull=False).first()
+        incident.description = 'Updated'
+        incident.save()
+        result = self.poll(after=cursor)
+        self.assertEqual([(event['event'], event['data']['properties']['id']) for event in result['events']],
+                         [('incident', incident.pk)])
+        self.assertEqual(self.poll(after=result['cursor'])['events'], [])
+
+    def test_reports_a_new_dashboard_etag(self):
+        etag = self.poll(dashboard='')['dashboard']
+        self.assertEqual(self.poll(dashboard=etag)['dashboard'], etag)
+        Incident.objects.first().delete()
+        self.assertNotEqual(self.poll(dashboard=etag)['dashboard'], etag)
+
+
+class MetricsTests(TestCase):
+
+    def test_every_route_has_its_own_view_label(self):
+        names = [pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)]
+        self.assertEqual(len(names), len(set(names)))
+
+
+class SlowQueryTests(TransactionTestCase):
+
+    def test_off_by_default(self):
+        self.client.get('/incident_list/')
+        self.assertFalse(SlowQuery.objects.exists())
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_saved_with_their_plan_once_the_request_has_finished(self):
+        explained_in_request = []
+        original = slowqueries.explain
+
+        def explain(*args):
+            explained_in_request.append(slowqueries.in_request.get())
+            return original(*args)
+
+        with mock.patch.object(slowqueries, 'explain', explain):
+            self.client.get('/incident_list/')
+        queries = list(SlowQuery.objects.filter(view='incident-list'))
+        self.assertTrue(any('fire_incident' in query.sql for query in queries))
+        self.assertTrue(all(query.plan for query in queries))
+        self.assertEqual(explained_in_request, [False] * len(queries))
+
+
+@mock.patch.object(sync, 'SETTLE_SECONDS', 0)
+class SyncTests(SeededTestCase):
+
+    def get(self, url, since=None):
+        response = self.client.get(url, {'since': since} if since else {})
+        return response.status_code, response.json()
+
+    def sync(self, url, since=None):
+        # (changes, cursor) after following every page
+        items = []
+        while True:
+            status, page = self.get(url, since)
+            self.assertEqual(status, 200, page)
+            items += page['changes']
+            since = page['cursor']
+            if not page['more']:
+                return items, since
+
+    def test_a_round_trip_returns_only_what_changed(self):
+        items, cursor = self.sync('/api/sync/firestation')
+        self.assertEqual(len(items), FireStation.objects.count())
+        station = FireStation.objects.order_by('pk').first()
+        station.name = 'Renamed'
+        station.save()
+        items, cursor = self.sync('/api/sync/firestation', cursor)
+        self.assertEqual([(item['op'], item['id'], item['data']['name']) for item in items],
+                         [('upsert', station.pk, 'Renamed')])
+        self.assertEqual(self.sync('/api/sync/firestation', cursor)[0], [])
+
+    def test_deletes_are_propagated(self):
+        cursor = self.sync('/api/sync')[1]
+        truck = FireTruck.objects.order_by('pk').first()
+        pk = truck.pk
+        truck.delete()
+        items, cursor = self.sync('/api/sync', cursor)
+        self.assertIn({'model': 'firetruck', 'op': 'delete', 'id': pk}, items)
+
+    def test_a_quiet_table_keeps_its_cursor(self):
+        FireStation.objects.update(updated_at=timezone.now() - timedelta(days=2 * settings.SYNC_TOMBSTONE_DAYS))
+        call_command('prune_tombstones', stdout=io.StringIO())
+        cursor = self.sync('/api/sync/firestation')[1]
+        self.assertEqual(self.get('/api/sync/firestation', cursor)[0], 200)
+
+    def test_a_cursor_behind_a_pruned_delete_expires(self):
+        # A client that synced long ago, then a delete since that is old enough to prune
+        synced = timezone.now() - timedelta(days=2 * settings.SYNC_TOMBSTONE_DAYS)
+        FireTruck.objects.update(updated_at=synced - timedelta(days=1))
+        with mock.patch.object(timezone, 'now', return_value=synced):
+            cursor = self.sync('/api/sync/firetruck')[1]
+        FireTruck.objects.order_by('pk').first().delete()
+        Tombstone.objects.update(updated_at=synced + timedelta(days=1))
+        call_command('prune_tombstones', stdout=io.StringIO())
+        self.assertFalse(Tombstone.objects.exists())
+        status, body = self.get('/api/sync/firetruck', cursor)
+        self.assertEqual(status, 410)
+        # Starting over gets a cursor that works again
+        self.assertEqual(self.get('/api/sync/firetruck', self.sync('/api/sync/firetruck')[1])[0], 200)
+
+
+class ApproximateCountTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # The estimate (the highest id) now overcounts by one
+        Incident.objects.order_by('pk').first().delete()
+
+    def count(self, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            count = pagination.ApproximateCountPaginator(queryset, 25).count
+        return count, [query['sql'] for query in queries]
+
+    def test_a_large_unfiltered_table_is_estimated(self):
+        with mock.patch.object(pagination, 'APPROXIMATE_COUNT_THRESHOLD', Incident.objects.count()):
+            count, queries = self.count(Incident.objects.order_by('-pk'))
+        self.assertEqual(count, Incident.objects.order_by('-pk').values_list('pk', flat=True).first())
+        self.assertNotEqual(count, Incident.objects.count())
+        self.assertFalse(any('COUNT(' in sql for sql in queries))
+
+    def test_filtered_and_small_tables_are_counted(self):
+        minor = Incident.objects.filter(severity_level='Minor Fire')
+        with mock.patch.object(pagination, 'APPROXIMATE_COUNT_THRESHOLD', 1):
+            count, queries = self.count(minor)
+        self.assertEqual(count, minor.count())
+        self.assertTrue(any('COUNT(' in sql for sql in queries))
+        self.assertEqual(self.count(Incident.objects.all())[0], Incident.objects.count())
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Locations.objects.create(name='Market', address='Rizal Ave', city='Puerto Princesa', country='PH')
+        cls.ids = [Incident.objects.create(location=location, severity_level='Minor Fire',
+                                           description='kitchen fire' + ' kitchen' * (n % 3)).pk
+                   for n in range(12)]
+
+    def test_ranks_only_the_newest_candidates(self):
+        with mock.patch.object(search, 'MAX_CANDIDATES', 5):
+            first = search.search('kitchen', 3)
+            rest = search.search('kitchen', 10, after=(first[-1][1], first[-1][0]))
+        found = [pk for pk, score in first + rest]
+        self.assertCountEqual(found, self.ids[-5:])
+        scores = [score for pk, score in first + rest]
+        self.assertEqual(scores, sorted(scores))
+
+    def test_the_api_says_when_matches_are_left_out(self):
+        for cap, truncated in ((5, True), (12, False)):
+            with self.subTest(cap=cap), mock.patch.object(search, 'MAX_CANDIDATES', cap):
+                response = self.client.get('/api/incidents/search', {'q': 'kitchen', 'page_size': 3})
+                self.assertEqual(response.json()['truncated'], truncated)
+
+    def test_finds_every_match_under_the_cap(self):
+        self.assertCountEqual([pk for pk, score in search.search('kitc', 100)], self.ids)
+
+
+class AdminTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_filters_use_an_index(self):
+        for model, filters, index in ((Incident, {'severity_level': 'Minor Fire'}, 'incident_severity_date_idx'),
+                                      (Firefighters, {'experience_level': 'Captain'}, 'firefighter_level_idx')):
+            ordering = admin.site._registry[model].get_ordering(None) or ['-pk']
+            with self.subTest(model=model.__name__):
+                plan = model.objects.filter(**filters).order_by(*ordering).explain()
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_search_says_when_matches_are_left_out(self):
+        with mock.patch.object(fire_admin, 'INCIDENT_SEARCH_LIMIT', 2):
+            response = self.client.get('/admin/fire/incident/', {'q': 'fire'}, follow=True)
+        self.assertContains(response, 'Only the newest 2 incidents matching')
+        response = self.client.get('/admin/fire/incident/', {'q': 'fire'})
+        self.assertNotContains(response, 'Only the newest')
+
+
+class WeatherIngestTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.incident = Incident.objects.order_by('pk').values_list('pk', flat=True).first()
+
+    def post(self, *readings):
+        return self.client.post('/api/weather/readings', json.dumps({'readings': list(readings)}),
+                                content_type='application/json')
+
+    def reading(self, minute, **values):
+        moment = datetime(2026, 1, 1, 12, minute, tzinfo=dt_timezone.utc)
+        return {'incident': self.incident, 'time': moment.isoformat(),
+                'temperature': 30, 'humidity': 60, 'wind_speed': 5, **values}
+
+    def test_rejects_values_that_are_not_finite(self):
+        for value in ('nan', 'inf', '-Infinity'):
+            with self.subTest(value=value):
+                response = self.post(self.reading(0), self.reading(1, temperature=value))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('reading 1: temperature must be a finite number', response.json()['error'])
+        self.assertFalse(WeatherReading.objects.exists())
+
+    def test_rejects_empty_batches_and_booleans(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'no readings')
+        for field in ('temperature', 'incident'):
+            with self.subTest(field=field):
+                response = self.post(self.reading(0, **{field: True}))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(f'reading 0: {field} must be a number', response.json()['error'])
+        self.assertFalse(WeatherReading.objects.exists())
+
+    def test_reports_the_rows_inserted(self):
+        self.assertEqual(self.post(self.reading(0), self.reading(1)).json(), {'accepted': 2})
+        # A resent batch, with a reading repeated and one new one
+        self.assertEqual(self.post(self.reading(0), self.reading(1), self.reading(2), self.reading(2)).json(),
+                         {'accepted': 1})
+        self.assertEqual(WeatherReading.objects.count(), 3)
+
+    def test_ingest_does_not_downsample(self):
+        with mock.patch.object(weather, 'roll_up') as roll_up:
+            self.post(self.reading(0))
+        roll_up.assert_not_called()
+
+
+class BulkWriteTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.incident = Incident.objects.order_by('pk').first()
+
+    def post(self, items, key=None, model='incident'):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(f'/api/bulk/{model}', json.dumps({'items': items}),
+                                content_type='application/json', headers=headers)
+
+    def new_incident(self, **values):
+        return {'location': self.incident.location_id, 'date_time': '2026-03-01T08:00:00+00:00',
+                'severity_level': 'Major Fire', 'description': 'Warehouse blaze', **values}
+
+    def test_an_invalid_item_rolls_back_the_batch(self):
+        before = Incident.objects.count()
+        response = self.post([self.new_incident(), self.new_incident(severity_level='Inferno'),
+                              {'id': self.incident.pk, 'description': ''}])
+        self.assertEqual(response.status_code, 400)
+        results = response.json()['results']
+        self.assertEqual(results[0], {'index': 0, 'status': 'valid'})
+        self.assertIn('severity_level', results[1]['errors'])
+        self.assertIn('description', results[2]['errors'])
+        self.assertEqual(Incident.objects.count(), before)
+        self.assertEqual(Incident.objects.get(pk=self.incident.pk).description, self.incident.description)
+
+    def test_unknown_ids_are_item_errors(self):
+        response = self.post([{'id': 10 ** 9, 'description': 'x'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('does not exist', str(response.json()['results'][0]['errors']))
+
+    def test_repeated_ids_are_rejected(self):
+        response = self.post([{'id': self.incident.pk, 'severity_level': 'Major Fire'},
+                              {'id': self.incident.pk, 'description': 'Second change'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'ids [{self.incident.pk}] appear more than once', response.json()['error'])
+
+    def test_updates_keep_updated_at_search_and_rollup_current(self):
+        started = timezone.now()
+        response = self.post([{'id': self.incident.pk, 'description': 'Zanzibar warehouse', 'severity_level': 'Major Fire'},
+                              self.new_incident(description='Quixotic kitchen')])
+        self.assertEqual(response.status_code, 200)
+        created = response.json()['results'][1]['id']
+        self.assertEqual([result['status'] for result in response.json()['results']], ['updated', 'created'])
+        self.assertGreaterEqual(Incident.objects.get(pk=self.incident.pk).updated_at, started)
+        self.assertEqual([pk for pk, score in search.search('zanzibar', 10)], [self.incident.pk])
+        self.assertEqual([pk for pk, score in search.search('quixotic', 10)], [created])
+        assertRollupRebuilt(self)
+
+    def test_a_key_replays_its_response(self):
+        items = [self.new_incident()]
+        first = self.post(items, key='batch-1')
+        count = Incident.objects.count()
+        again = self.post(items, key='batch-1')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(Incident.objects.count(), count)
+
+    def test_a_key_reused_for_another_request_is_refused(self):
+        self.post([self.new_incident()], key='batch-2')
+        response = self.post([self.new_incident(description='Something else')], key='batch-2')
+        self.assertEqual(response.status_code, 422)
+
+
+class RosterTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.station, cls.other = FireStation.objects.order_by('pk')[:2]
+
+    def assertRostersCounted(self):
+        # Every maintained roster matches a recount from its trucks and crew
+        counts = rosters.station_counts()
+        for roster in StationRoster.objects.all():
+            expected = counts.get(roster.station_id, {})
+            for field in geojson.ROSTER_FIELDS:
+                self.assertEqual(getattr(roster, field), expected.get(field, 0), (roster.station_id, field))
+
+    def new_truck(self, station, capacity=4000):
+        return FireTruck.objects.create(truck_number='T-99', model='Pumper', capacity=capacity, station=station)
+
+    def test_saves_and_deletes_are_counted(self):
+        truck = self.new_truck(self.station)
+        firefighter = Firefighters.objects.create(name='Ana', rank='Captain', experience_level='Captain',
+                                                  station=self.station)
+        self.assertRostersCounted()
+        truck.capacity = 6000
+        truck.save()
+        firefighter.experience_level = 'Battalion Chief'
+        firefighter.save()
+        self.assertRostersCounted()
+        truck.delete()
+        firefighter.delete()
+        self.assertRostersCounted()
+
+    def test_moving_between_stations_is_counted(self):
+        truck = self.new_truck(self.station)
+        firefighter = Firefighters.objects.create(name='Ana', rank='Driver', experience_level='Driver',
+                                                  station=self.station)
+        truck.station = self.other
+        truck.save()
+        firefighter.station = self.other
+        firefighter.save()
+        self.assertRostersCounted()
+
+    def test_bulk_writes_are_counted(self):
+        truck = FireTruck.objects.filter(station=self.station).first()
+        firefighter = Firefighters.objects.filter(station=self.station).first()
+
+        def post(model, items):
+            response = self.client.post(f'/api/bulk/{model}', json.dumps({'items': items}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        post('firetruck', [{'truck_number': 'T-98', 'model': 'Tanker', 'capacity': 9000, 'station': self.other.pk},
+                           {'id': truck.pk, 'station': self.other.pk, 'capacity': 100}])
+        post('firefighters', [{'name': 'Ben', 'rank': 'Probationary', 'experience_level': 'Probationary Firefighter',
+                               'station': self.station.pk},
+                              {'id': firefighter.pk, 'station': self.other.pk, 'experience_level': 'Captain'}])
+        self.assertRostersCounted()
+
+    def test_a_drifted_roster_is_clamped_field_by_field(self):
+        StationRoster.objects.filter(station=self.station).update(trucks=0, capacity=0)
+        firefighters = StationRoster.objects.get(station=self.station).firefighters
+        rosters.apply_delta(self.station.pk, {'trucks': -1, 'capacity': -4000, 'firefighters': 1})
+        roster = StationRoster.objects.get(station=self.station)
+        self.assertEqual((roster.trucks, roster.capacity, roster.firefighters), (0, 0, firefighters + 1))
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    """The FIRE_DB_PROFILE=production backend, on a scratch database file."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = os.path.join(directory.name, 'db.sqlite3')
+        with mock.patch.dict(os.environ, {'FIRE_DB_PROFILE': 'production'}):
+            profile = runpy.run_path(project_settings.__file__)['DATABASES']['default']
+        # Fail at once on a lock, so only the backend's own retries wait
+        profile = {**profile, 'NAME': name, 'CONN_MAX_AGE': 0, 'OPTIONS': {**profile['OPTIONS'], 'timeout': 0}}
+        profile = connections.configure_settings({'default': profile})['default']
+        self.db = load_backend(profile['ENGINE']).DatabaseWrapper(profile, 'production')
+        connections['production'] = self.db
+        self.addCleanup(connections.__delitem__, 'production')
+        self.addCleanup(self.db.close)
+        with self.db.cursor() as cursor:
+            cursor.execute('CREATE TABLE reading (value integer)')
+        # Another process holding the write lock
+        self.blocker = sqlite3.connect(name, isolation_level=None)
+        self.addCleanup(self.blocker.close)
+        self.blocker.execute('BEGIN IMMEDIATE')
+
+    def released_on_backoff(self):
+        # The lock is released while the backend backs off
+        return mock.patch.object(sqlite_backend.time, 'sleep', side_effect=lambda seconds: self.blocker.rollback())
+
+    def pragma(self, name):
+        with self.db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_the_production_profile_applies_its_pragmas(self):
+        self.assertEqual(self.db.settings_dict['ENGINE'], 'fire.backends.sqlite3')
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+
+    def test_a_locked_write_is_retried_outside_a_transaction(self):
+        with self.released_on_backoff() as sleep:
+            with self.db.cursor() as cursor:
+                cursor.execute('INSERT INTO reading VALUES (1)')
+        sleep.assert_called_once()
+        self.assertEqual(self.blocker.execute('SELECT count(*) FROM reading').fetchone()[0], 1)
+
+    def test_a_transaction_waits_for_the_lock_to_begin(self):
+        with self.released_on_backoff() as sleep:
+            with transaction.atomic(using='production'):
+                with self.db.cursor() as cursor:
+                    cursor.execute('INSERT INTO reading VALUES (1)')
+        sleep.assert_called_once()
+
+    def test_a_lock_inside_a_transaction_is_surfaced(self):
+        self.blocker.rollback()
+        locked = mock.Mock(side_effect=sqlite3.OperationalError('database is locked'))
+        with mock.patch.object(sqlite_backend.time, 'sleep') as sleep:
+            with self.assertRaises(sqlite3.OperationalError):
+                with transaction.atomic(using='production'):
+                    self.db.retry_locked(locked)
+        locked.assert_called_once()
+        sleep.assert_not_called()
+
+    def test_retries_give_up(self):
+        with mock.patch.object(sqlite_backend.time, 'sleep') as sleep:
+            with self.assertRaises(OperationalError):
+                with self.db.cursor() as cursor:
+                    cursor.execute('INSERT INTO reading VALUES (1)')
+        self.assertEqual(sleep.call_count, self.db.write_retries)
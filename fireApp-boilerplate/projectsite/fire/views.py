@@ -1,20 +1,28 @@
-from django.shortcuts import render
+import json
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404, render
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.views.generic import ListView
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db import connection
-from django.db.models.functions import ExtractMonth
-from django.db.models import Count
-from datetime import datetime
-
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
+
+from fire import autocomplete, bulk, charts, clustering, dispatch, exports, geojson, live, metrics, search, spatial, sync, weather
+from fire.cache import versioned_cache
+from fire.compression import compress_response
 from fire.models import Locations, Incident, FireStation, Firefighters, FireTruck, WeatherConditions
 from fire.forms import LocationsForm, IncidentForm, FireStationForm, FirefightersForm, FireTruckForm, WeatherConditionsForm
+from fire.pagination import KeysetPaginationMixin, decode_keys, encode_keys, encode_position
+from fire.routers import ReadReplicaMixin, read_from_replica
 
 # === GENERAL VIEWS ===
 
-class HomePageView(ListView):
+class HomePageView(ReadReplicaMixin, KeysetPaginationMixin, ListView):
     model = Locations
     context_object_name = 'home'
     template_name = "home.html"
@@ -23,107 +31,347 @@ class ChartView(ListView):
     template_name = 'chart.html'
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['live_stream'] = settings.FIRE_ASYNC_VIEWS
         return context
     def get_queryset(self, *args, **kwargs):
         pass
 
 # === JSON CHART VIEWS ===
 
+@read_from_replica
 def PieCountbySeverity(request):
-    query = '''
-        SELECT severity_level, COUNT(*) as count
-        FROM fire_incident
-        GROUP BY severity_level
-    '''
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
-    data = {severity: count for severity, count in rows} if rows else {}
-    return JsonResponse(data)
+    return JsonResponse(charts.severity_counts())
 
+@read_from_replica
 def LineCountbyMonth(request):
-    current_year = datetime.now().year
-    result = {month: 0 for month in range(1, 13)}
-    incidents_per_month = Incident.objects.filter(date_time__year=current_year).values_list('date_time', flat=True)
-    for date_time in incidents_per_month:
-        result[date_time.month] += 1
-    month_names = {1:'Jan',2:'Feb',3:'Mar',4:'Apr',5:'May',6:'Jun',7:'Jul',8:'Aug',9:'Sep',10:'Oct',11:'Nov',12:'Dec'}
-    result_named = {month_names[k]: v for k, v in result.items()}
-    return JsonResponse(result_named)
+    return JsonResponse(charts.monthly_counts())
+
+@compress_response
+@read_from_replica
+@condition(etag_func=charts.dashboard_etag)
+def dashboard_data(request):
+    return JsonResponse(charts.dashboard_data())
 
+# === MAP VIEWS ===
+
+@versioned_cache(Incident, Locations)
+def incident_cities():
+    return list(Incident.objects.values_list('location__city', flat=True).distinct().order_by('location__city'))
+
+@read_from_replica
 def map_station(request):
-    stations = FireStation.objects.values('name', 'latitude', 'longitude')
-    for fs in stations:
-        fs['latitude'] = float(fs['latitude'])
-        fs['longitude'] = float(fs['longitude'])
-    return render(request, 'map_station.html', {'fireStations': list(stations)})
+    return render(request, 'map_station.html')
 
+@read_from_replica
 def map_incidents(request):
-    fireIncidents = Incident.objects.select_related('location').values(
-        'location__city', 'location__latitude', 'location__longitude',
-        'description', 'date_time', 'severity_level'
-    )
-    incident_list = [{
-        'city': fi['location__city'],
-        'latitude': float(fi['location__latitude']),
-        'longitude': float(fi['location__longitude']),
-        'description': fi['description'],
-        'date': fi['date_time'].strftime('%Y-%m-%d %H:%M') if fi['date_time'] else 'N/A',
-        'severity': fi['severity_level']
-    } for fi in fireIncidents]
-
-    cities = Incident.objects.select_related('location').values_list('location__city', flat=True).distinct()
-    return render(request, 'map_incidents.html', {'fireIncidents': incident_list, 'cities': cities})
-
+    return render(request, 'map_incidents.html', {'cities': incident_cities(), 'live_stream': settings.FIRE_ASYNC_VIEWS})
+
+# === GEOJSON API ===
+
+@read_from_replica
+def incidents_geojson(request):
+    try:
+        incidents = geojson.filter_incidents(Incident.objects.all(), request.GET)
+    except geojson.FilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    rows = geojson.incident_rows(incidents).iterator(chunk_size=geojson.CHUNK_SIZE)
+    return StreamingHttpResponse(
+        geojson.feature_collection(rows, geojson.incident_feature),
+        content_type='application/geo+json')
+
+@read_from_replica
+def incident_clusters(request):
+    try:
+        zoom = int(request.GET.get('zoom', ''))
+    except ValueError:
+        return JsonResponse({'error': 'zoom must be an integer'}, status=400)
+    try:
+        result = clustering.clusters(zoom, request.GET)
+    except geojson.FilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'zoom': zoom, 'clusters': result})
+
+# === LIVE FEED ===
+
+def incident_feed(request):
+    # Long-poll: incidents changed after ?after=<cursor>, answered as soon as
+    # there are any. With ?dashboard=<etag> it also answers when the
+    # dashboard's ETag differs. The Server-Sent Events version of the feed is
+    # only served under ASGI (async_views.incident_feed), where an open
+    # stream does not hold a worker thread.
+    feed = live.IncidentFeed(request.GET.get('after'), charts=False)
+    events, etag = live.long_poll(feed, request.GET.get('dashboard'))
+    response = JsonResponse({
+        'events': [{'event': name, 'id': id, 'data': data} for name, data, id in events],
+        'cursor': encode_position(*feed.position),
+        'dashboard': etag,
+    })
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+# === SYNC API ===
+
+@read_from_replica
+def sync_changes(request, model=None):
+    # Everything changed since ?since=<cursor>, for one model or all of them
+    if model is not None and model not in sync.SYNC_MODELS:
+        return JsonResponse({'error': f'unknown model {model!r}'}, status=404)
+    try:
+        cursor = sync.parse_cursor(request.GET.get('since'))
+        limit = max(1, min(int(request.GET.get('limit', sync.DEFAULT_LIMIT)), sync.MAX_LIMIT))
+    except sync.CursorExpired as e:
+        return JsonResponse({'error': str(e)}, status=410)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    items, cursor, more = sync.changes(cursor, model, limit)
+    return JsonResponse({'changes': items, 'cursor': cursor, 'more': more})
+
+# === SEARCH ===
+
+def search_results(request):
+    # ([(incident, score)], next cursor) for ?q=, paged with ?after=<cursor>
+    page_size = max(1, min(int(request.GET.get('page_size', 25)), 100))
+    after = None
+    if request.GET.get('after'):
+        score, pk = decode_keys(request.GET['after'])
+        after = (float(score), int(pk))
+    matches = search.search(request.GET.get('q'), page_size + 1, after)
+    next_cursor = None
+    if len(matches) > page_size:
+        matches = matches[:page_size]
+        pk, score = matches[-1]
+        next_cursor = encode_keys(score, pk)
+    incidents = Incident.objects.select_related('location').in_bulk([pk for pk, score in matches])
+    return [(incidents[pk], score) for pk, score in matches if pk in incidents], next_cursor
+
+@read_from_replica
+def incident_search_api(request):
+    try:
+        results, next_cursor = search_results(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': [{
+        'id': incident.pk,
+        'description': incident.description,
+        'date_time': incident.date_time,
+        'severity_level': incident.severity_level,
+        'location': {
+            'id': incident.location_id,
+            'name': incident.location.name,
+            'address': incident.location.address,
+            'city': incident.location.city,
+        },
+        'score': round(-score, 6),  # higher is better
+    } for incident, score in results], 'next': next_cursor,
+        # Older matches than the ranked ones are left out, as the search page says
+        'truncated': search.truncated(request.GET.get('q'))})
+
+@read_from_replica
+def incident_search(request):
+    results, next_cursor, error = [], None, None
+    if request.GET.get('q'):
+        try:
+            results, next_cursor = search_results(request)
+        except ValueError as e:
+            error = str(e)
+    return render(request, 'incident_search.html', {
+        'query': request.GET.get('q', ''),
+        'incidents': [incident for incident, score in results],
+        'next_cursor': next_cursor,
+        'error': error,
+        'max_candidates': search.MAX_CANDIDATES,
+    })
+
+# === BULK WRITES ===
+
+@csrf_exempt
+@require_POST
+def bulk_write(request, model):
+    # {"items": [{...}, ...]}: items with an "id" are updates, the others creates
+    if model not in bulk.BULK_FORMS:
+        return JsonResponse({'error': f'unknown model {model!r}'}, status=404)
+    key = request.headers.get('Idempotency-Key')
+    try:
+        items = bulk.parse_items(json.loads(request.body))
+        status, response = bulk.apply(model, items, key, bulk.request_hash(model, request.body))
+    except bulk.KeyReused as e:
+        return JsonResponse({'error': str(e)}, status=422)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(response, status=status)
+
+# === WEATHER SERIES ===
+
+@csrf_exempt
+@require_POST
+def ingest_weather(request):
+    # Sensor batches: {"readings": [{"incident", "time", "temperature", "humidity", "wind_speed"}]}
+    try:
+        readings = weather.parse_readings(json.loads(request.body))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'accepted': weather.ingest(readings)}, status=202)
+
+def query_time(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"invalid {name} {value!r}")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+@read_from_replica
+def weather_series(request, pk):
+    # ?since=&until= (ISO 8601) and ?resolution=hour|day to average further
+    try:
+        since, until = query_time(request, 'since'), query_time(request, 'until')
+        resolution = request.GET.get('resolution')
+        if resolution and resolution not in weather.RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {', '.join(weather.RESOLUTIONS)}")
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    series = weather.series(pk, since, until, weather.RESOLUTIONS.get(resolution))
+    return JsonResponse({'incident': pk, **series})
+
+# === AUTOCOMPLETE ===
+
+@read_from_replica
+def autocomplete_options(request, source):
+    # Options for a form's foreign key widget: ?q=<prefix>&limit=
+    if source not in autocomplete.SOURCES:
+        return JsonResponse({'error': f'unknown source {source!r}'}, status=404)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT)), autocomplete.MAX_LIMIT))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    options, more = autocomplete.SOURCES[source].options(request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [{'id': pk, 'text': label} for pk, label in options], 'more': more})
+
+# === METRICS ===
+
+def prometheus_metrics(request):
+    return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# === EXPORTS ===
+
+@read_from_replica
+def export_incidents(request, fmt):
+    try:
+        rows = exports.export_rows(request.GET)
+    except geojson.FilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    to_lines, content_type = exports.FORMATS[fmt]
+    response = StreamingHttpResponse(to_lines(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="incidents.{fmt}"'
+    return response
+
+# === SPATIAL API ===
+
+def query_point(request):
+    # (latitude, longitude) from ?incident=<id> or ?lat=&lon=
+    if request.GET.get('incident'):
+        location = get_object_or_404(
+            Incident.objects.select_related('location'), pk=request.GET['incident']).location
+        if location.latitude is None or location.longitude is None:
+            raise ValueError("incident location has no coordinates")
+        return float(location.latitude), float(location.longitude)
+    try:
+        latitude, longitude = float(request.GET['lat']), float(request.GET['lon'])
+    except (KeyError, ValueError):
+        raise ValueError("pass ?incident=<id> or numeric ?lat= and ?lon=")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("lat/lon out of range")
+    return latitude, longitude
+
+def station_results(matches):
+    stations = FireStation.objects.in_bulk([pk for pk, distance in matches])
+    return [{
+        'id': pk,
+        'name': stations[pk].name,
+        'latitude': float(stations[pk].latitude),
+        'longitude': float(stations[pk].longitude),
+        'distance_km': round(distance, 3),
+    } for pk, distance in matches if pk in stations]
+
+@read_from_replica
+def nearest_stations(request):
+    try:
+        latitude, longitude = query_point(request)
+        k = max(1, min(int(request.GET.get('k', 5)), 100))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    matches = spatial.nearest_stations(latitude, longitude, k)
+    return JsonResponse({'stations': station_results(matches)})
+
+@read_from_replica
+def stations_within(request):
+    try:
+        latitude, longitude = query_point(request)
+        radius_km = float(request.GET.get('radius_km', 10))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not 0 < radius_km <= 500:
+        return JsonResponse({'error': 'radius_km must be between 0 and 500'}, status=400)
+    matches = spatial.stations_within(latitude, longitude, radius_km)
+    return JsonResponse({'stations': station_results(matches)})
+
+def dispatch_results(incident, limit):
+    location = incident.location
+    if location.latitude is None or location.longitude is None:
+        raise ValueError("incident location has no coordinates")
+    ranked = dispatch.recommend(float(location.latitude), float(location.longitude), incident.severity_level, limit)
+    stations = FireStation.objects.in_bulk([station_id for station_id, *rest in ranked])
+    return [{
+        'id': station_id,
+        'name': stations[station_id].name,
+        'latitude': float(stations[station_id].latitude),
+        'longitude': float(stations[station_id].longitude),
+        'distance_km': round(distance, 3),
+        'trucks': resources['trucks'],
+        'capacity_liters': resources['capacity'],
+        'crew': resources['crew'],
+        'experience': round(resources['experience'], 2),
+        'score': round(score, 4),
+    } for station_id, distance, resources, score in ranked if station_id in stations]
+
+@read_from_replica
+def dispatch_recommendations(request, pk):
+    incident = get_object_or_404(Incident.objects.select_related('location'), pk=pk)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 5)), 20))
+        results = dispatch_results(incident, limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'incident': incident.pk, 'severity': incident.severity_level, 'stations': results})
+
+@read_from_replica
+def incident_dispatch(request, pk):
+    incident = get_object_or_404(Incident.objects.select_related('location'), pk=pk)
+    try:
+        results, error = dispatch_results(incident, 10), None
+    except ValueError as e:
+        results, error = [], str(e)
+    return render(request, 'incident_dispatch.html', {'incident': incident, 'stations': results, 'error': error})
+
+@read_from_replica
+def stations_geojson(request):
+    try:
+        stations = geojson.filter_bbox(FireStation.objects.all(), request.GET)
+    except geojson.FilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    rows = geojson.station_rows(stations).iterator(chunk_size=geojson.CHUNK_SIZE)
+    return StreamingHttpResponse(
+        geojson.feature_collection(rows, geojson.station_feature),
+        content_type='application/geo+json')
+
+@read_from_replica
 def MultilineIncidentTop3Country(request):
-    query = '''
-        SELECT fl.country, strftime('%m', fi.date_time) AS month, COUNT(fi.id) AS incident_count
-        FROM fire_incident fi
-        JOIN fire_locations fl ON fi.location_id = fl.id
-        WHERE fl.country IN (
-            SELECT fl_top.country
-            FROM fire_incident fi_top
-            JOIN fire_locations fl_top ON fi_top.location_id = fl_top.id
-            WHERE strftime('%Y', fi_top.date_time) = strftime('%Y', 'now')
-            GROUP BY fl_top.country
-            ORDER BY COUNT(fi_top.id) DESC
-            LIMIT 3
-        )
-        AND strftime('%Y', fi.date_time) = strftime('%Y', 'now')
-        GROUP BY fl.country, month
-        ORDER BY fl.country, month;
-    '''
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-    result = {}
-    months = set(str(i).zfill(2) for i in range(1, 13))
-    for country, month, count in rows:
-        result.setdefault(country, {m: 0 for m in months})[month] = count
-    while len(result) < 3:
-        result[f"Country {len(result)+1}"] = {m: 0 for m in months}
-    for country in result:
-        result[country] = dict(sorted(result[country].items()))
-    return JsonResponse(result)
+    return JsonResponse(charts.top3_country_monthly_counts())
 
+@read_from_replica
 def multipleBarbySeverity(request):
-    query = '''
-        SELECT fi.severity_level, strftime('%m', fi.date_time) AS month, COUNT(fi.id)
-        FROM fire_incident fi
-        GROUP BY fi.severity_level, month
-    '''
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-    result = {}
-    months = set(str(i).zfill(2) for i in range(1, 13))
-    for level, month, count in rows:
-        result.setdefault(str(level), {m: 0 for m in months})[month] = count
-    for level in result:
-        result[level] = dict(sorted(result[level].items()))
-    return JsonResponse(result)
+    return JsonResponse(charts.severity_monthly_counts())
 
 # === SHARED MESSAGE MIXIN ===
 
@@ -161,7 +409,7 @@ class LocationsDeleteView(MessageMixin, DeleteView):
     success_url = reverse_lazy('locations-list')
     success_message = "Location successfully deleted."
 
-class LocationsListView(ListView):
+class LocationsListView(ReadReplicaMixin, KeysetPaginationMixin, ListView):
     model = Locations
     template_name = 'locations_list.html'
     context_object_name = 'locations'
@@ -187,10 +435,11 @@ class IncidentDeleteView(MessageMixin, DeleteView):
     success_url = reverse_lazy('incident-list')
     success_message = "Incident successfully deleted."
 
-class IncidentListView(ListView):
+class IncidentListView(ReadReplicaMixin, KeysetPaginationMixin, ListView):
     model = Incident
     template_name = 'incident_list.html'
     context_object_name = 'incidents'
+    list_select_related = ('location',)
 
 # FIRE STATION
 class FireStationCreateView(MessageMixin, CreateView):
@@ -213,10 +462,11 @@ class FireStationDeleteView(MessageMixin, DeleteView):
     success_url = reverse_lazy('firestation-list')
     success_message = "Fire Station successfully deleted."
 
-class FireStationListView(ListView):
+class FireStationListView(ReadReplicaMixin, KeysetPaginationMixin, ListView):
     model = FireStation
     template_name = 'firestation_list.html'
     context_object_name = 'stations'
+    list_select_related = ('roster',)
 
 # FIREFIGHTERS
 class FirefighterCreateView(MessageMixin, CreateView):
@@ -239,10 +489,11 @@ class FirefighterDeleteView(MessageMixin, DeleteView):
     success_url = reverse_lazy('firefighter-list')
     success_message = "Firefighter successfully deleted."
 
-class FirefighterListView(ListView):
+class FirefighterListView(ReadReplicaMixin, KeysetPaginationMixin, ListView):
     model = Firefighters
     template_name = 'firefighter_list.html'
     context_object_name = 'firefighters'
+    list_select_related = ('station',)
 
 # FIRE TRUCK
 class FireTruckCreateView(MessageMixin, CreateView):
@@ -265,10 +516,11 @@ class FireTruckDeleteView(MessageMixin, DeleteView):
     success_url = reverse_lazy('firetruck-list')
     success_message = "Fire Truck successfully deleted."
 
-class FireTruckListView(ListView):
+class FireTruckListView(ReadReplicaMixin, KeysetPaginationMixin, ListView):
     model = FireTruck
     template_name = 'firetruck_list.html'
     context_object_name = 'firetrucks'
+    list_select_related = ('station',)
 
 # WEATHER CONDITIONS
 class WeatherConditionsCreateView(MessageMixin, CreateView):
@@ -291,7 +543,8 @@ class WeatherConditionsDeleteView(MessageMixin, DeleteView):
     success_url = reverse_lazy('weatherconditions-list')
     success_message = "Weather condition successfully deleted."
 
-class WeatherConditionsListView(ListView):
+class WeatherConditionsListView(ReadReplicaMixin, KeysetPaginationMixin, ListView):
     model = WeatherConditions
     template_name = 'weatherconditions_list.html'
     context_object_name = 'weather_conditions'
+    list_select_related = ('incident',)
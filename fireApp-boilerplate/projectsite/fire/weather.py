@@ -0,0 +1,203 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from fire.models import Incident, WeatherReading
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+RESOLUTIONS = {'minute': MINUTE, 'hour': HOUR, 'day': DAY}
+TRUNCATE = {HOUR: TruncHour, DAY: TruncDay}
+MAX_BATCH = 10000
+BATCH_SIZE = 1000
+MEASURES = ('temperature', 'humidity', 'wind_speed')
+
+
+class ReadingError(ValueError):
+    pass
+
+
+def floor_time(moment, seconds):
+    # Start of the UTC bucket of ``seconds`` that moment falls in
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def parse_reading(number, item):
+    try:
+        moment = parse_datetime(str(item['time']))
+        values = {measure: float(item[measure]) for measure in MEASURES}
+        incident_id = int(item['incident'])
+    except KeyError as e:
+        raise ReadingError(f"reading {number}: missing {e}")
+    except (TypeError, ValueError) as e:
+        raise ReadingError(f"reading {number}: {e}")
+    # float() and int() would take JSON true/false as 1 and 0
+    for field in ('incident', *MEASURES):
+        if isinstance(item[field], bool):
+            raise ReadingError(f"reading {number}: {field} must be a number, not {str(item[field]).lower()}")
+    if moment is None:
+        raise ReadingError(f"reading {number}: invalid time {item['time']!r}")
+    for measure, value in values.items():
+        if not math.isfinite(value):
+            raise ReadingError(f"reading {number}: {measure} must be a finite number")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return WeatherReading(
+        incident_id=incident_id, time=floor_time(moment, MINUTE), interval=MINUTE, samples=1,
+        wind_speed_max=values['wind_speed'], **values)
+
+
+def parse_readings(payload):
+    """
+    WeatherReading rows from ``{"readings": [{"incident", "time",
+    "temperature", "humidity", "wind_speed"}, ...]}``. Times are floored to
+    the minute.
+    """
+    items = payload.get('readings') if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        raise ReadingError('expected {"readings": [...]}')
+    if not items:
+        raise ReadingError("no readings")
+    if len(items) > MAX_BATCH:
+        raise ReadingError(f"at most {MAX_BATCH} readings per batch")
+    readings = [parse_reading(number, item) for number, item in enumerate(items)]
+    incident_ids = {reading.incident_id for reading in readings}
+    unknown = incident_ids - set(Incident.objects.filter(pk__in=incident_ids).values_list('pk', flat=True))
+    if unknown:
+        raise ReadingError(f"unknown incidents {sorted(unknown)}")
+    return readings
+
+
+def ingest(readings):
+    """
+    Append in bulk and return the number of rows inserted. A second reading
+    for the same incident and minute (a resent batch) is dropped. Aged rows
+    are downsampled separately, by the downsample_weather command.
+    """
+    if not readings:
+        return 0
+    times = [reading.time for reading in readings]
+    with transaction.atomic():
+        stored = set(WeatherReading.objects.filter(
+            interval=MINUTE, time__range=(min(times), max(times)),
+            incident_id__in={reading.incident_id for reading in readings},
+        ).values_list('incident_id', 'time'))
+        new = []
+        for reading in readings:
+            key = (reading.incident_id, reading.time)
+            if key not in stored:
+                stored.add(key)
+                new.append(reading)
+        # Conflicts left are only with a batch committed meanwhile
+        WeatherReading.objects.bulk_create(new, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(new)
+
+
+# === DOWNSAMPLING ===
+
+def buckets(readings, seconds):
+    # Sample-weighted totals of ``readings`` per (incident, bucket of ``seconds``)
+    return (readings
+            .annotate(bucket=TRUNCATE[seconds]('time', tzinfo=dt_timezone.utc))
+            .values('incident_id', 'bucket')
+            .annotate(n=Sum('samples'),
+                      t=Sum(F('temperature') * F('samples')),
+                      h=Sum(F('humidity') * F('samples')),
+                      w=Sum(F('wind_speed') * F('samples')),
+                      gust=Max('wind_speed_max'))
+            .order_by())
+
+
+def roll_up(source, target, cutoff):
+    """
+    Replace the ``source``-interval rows older than ``cutoff`` with
+    ``target``-interval rows, merged into any target row already there
+    (readings that arrived after their bucket was first rolled up).
+    """
+    old = WeatherReading.objects.filter(interval=source, time__lt=cutoff)
+    with transaction.atomic():
+        # Rows appended while this runs are left for the next run
+        last = old.order_by('-id').values_list('id', flat=True).first()
+        if last is None:
+            return 0
+        old = old.filter(id__lte=last)
+        rows = list(buckets(old, target))
+        existing = {
+            (row.incident_id, row.time): row
+            for row in WeatherReading.objects.filter(
+                interval=target, time__lt=cutoff, time__gte=min(row['bucket'] for row in rows),
+                incident_id__in={row['incident_id'] for row in rows})
+        }
+        created, updated = [], []
+        for row in rows:
+            n, t, h, w, gust = row['n'], row['t'], row['h'], row['w'], row['gust']
+            current = existing.get((row['incident_id'], row['bucket']))
+            if current is not None:
+                n += current.samples
+                t += current.temperature * current.samples
+                h += current.humidity * current.samples
+                w += current.wind_speed * current.samples
+                gust = max(gust, current.wind_speed_max)
+            reading = current or WeatherReading(incident_id=row['incident_id'], time=row['bucket'], interval=target)
+            reading.samples = n
+            reading.temperature, reading.humidity, reading.wind_speed = t / n, h / n, w / n
+            reading.wind_speed_max = gust
+            (updated if current is not None else created).append(reading)
+        WeatherReading.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        WeatherReading.objects.bulk_update(
+            updated, ['samples', *MEASURES, 'wind_speed_max'], batch_size=BATCH_SIZE)
+        old.delete()
+    return len(rows)
+
+
+def downsample(now=None):
+    """
+    Minute rows older than WEATHER_MINUTE_RETENTION_HOURS become hourly
+    rows, and hourly rows older than WEATHER_HOURLY_RETENTION_DAYS become
+    daily rows. Returns the (hourly, daily) rows written.
+    """
+    now = now or timezone.now()
+    hourly = roll_up(MINUTE, HOUR, floor_time(now - timedelta(hours=settings.WEATHER_MINUTE_RETENTION_HOURS), HOUR))
+    daily = roll_up(HOUR, DAY, floor_time(now - timedelta(days=settings.WEATHER_HOURLY_RETENTION_DAYS), DAY))
+    return hourly, daily
+
+
+# === SERIES ===
+
+def series(incident_id, since=None, until=None, resolution=None):
+    """
+    One incident's weather as parallel arrays, oldest first. Without a
+    resolution the stored rows are returned as they are (daily, then
+    hourly, then minute rows as they get more recent); with one, they are
+    averaged into buckets of that size.
+    """
+    readings = WeatherReading.objects.filter(incident_id=incident_id)
+    if since is not None:
+        readings = readings.filter(time__gte=since)
+    if until is not None:
+        readings = readings.filter(time__lt=until)
+
+    data = {name: [] for name in ('time', 'interval', 'samples', *MEASURES, 'wind_speed_max')}
+    if resolution in TRUNCATE:
+        rows = buckets(readings, resolution).order_by('bucket')
+        for row in rows:
+            n = row['n']
+            values = (row['bucket'], resolution, n, row['t'] / n, row['h'] / n, row['w'] / n, row['gust'])
+            for name, value in zip(data, values):
+                data[name].append(value)
+    else:
+        fields = ('time', 'interval', 'samples', *MEASURES, 'wind_speed_max')
+        for values in readings.order_by('time', '-interval').values_list(*fields):
+            for name, value in zip(data, values):
+                data[name].append(value)
+
+    data['time'] = [int(moment.timestamp()) for moment in data['time']]
+    for name in (*MEASURES, 'wind_speed_max'):
+        data[name] = [round(value, 2) for value in data[name]]
+    return data
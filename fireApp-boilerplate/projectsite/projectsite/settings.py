@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "fire.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "fire.middleware.ReplicaPinningMiddleware",
 ]
 
 ROOT_URLCONF = "projectsite.urls"
@@ -82,6 +84,103 @@ DATABASES = {
     }
 }
 
+# Opt-in production profile: WAL + tuned PRAGMAs, persistent connections and
+# lock-contention handling (see fire/backends/sqlite3/base.py).
+if os.environ.get("FIRE_DB_PROFILE") == "production":
+    DATABASES["default"].update({
+        "ENGINE": "fire.backends.sqlite3",
+        "CONN_MAX_AGE": int(os.environ.get("FIRE_DB_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": 20,  # seconds a writer waits for the lock
+            "write_retries": 5,
+            "pragmas": {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "mmap_size": 256 * 1024 * 1024,
+                "cache_size": -64 * 1024,
+            },
+        },
+    })
+
+# Read replicas: FIRE_DB_REPLICAS is a comma-separated list of database files
+# (a copy of db.sqlite3 works as a local stand-in). Chart, map and list views
+# read from them; writes and read-after-write requests stay on "default".
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get("FIRE_DB_REPLICAS", "").split(",")), start=1):
+    alias = f"replica{number}"
+    DATABASES[alias] = {**DATABASES["default"], "NAME": name, "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["fire.routers.PrimaryReplicaRouter"]
+# How far the replicas may lag: for this long after a write, the writer's
+# requests and anything cached from the changed models read the primary.
+REPLICA_PIN_SECONDS = 5
+
+# Serve the async chart and map views (fire/async_views.py). Set by
+# projectsite/asgi.py; under WSGI the sync views are used, since Django
+# buffers async streaming responses there. Besides the SSE feed, what they
+# gain is that the dashboard series and cluster tiles are read concurrently
+# (fire/aio.py); the other views do the same work as their sync versions.
+FIRE_ASYNC_VIEWS = os.environ.get("FIRE_ASYNC_VIEWS") == "1"
+
+# Delete tombstones for the sync API (fire/sync.py) are kept this long;
+# once some are pruned, clients whose cursor is older than them must
+# download everything again.
+SYNC_TOMBSTONE_DAYS = 90
+
+# Per-view request metrics (fire/metrics.py). With several worker processes
+# point FIRE_METRICS_DIR at a directory they share, emptied on deploy, so
+# /metrics reports all of them rather than the one that answered.
+METRICS_DIR = os.environ.get("FIRE_METRICS_DIR")
+
+# Queries slower than this many milliseconds are saved with their EXPLAIN
+# plan and listed in the admin (fire/slowqueries.py). Off (None) unless
+# FIRE_SLOW_QUERY_MS is set; "off" or an empty value also turns it off.
+# Each capture costs an EXPLAIN, run once the request has finished. Only
+# the newest SLOW_QUERY_LIMIT are kept.
+SLOW_QUERY_MS = None
+if os.environ.get("FIRE_SLOW_QUERY_MS", "").strip().lower() not in ("", "off"):
+    SLOW_QUERY_MS = float(os.environ["FIRE_SLOW_QUERY_MS"])
+SLOW_QUERY_LIMIT = 1000
+
+# Sensor weather (fire/weather.py) is kept at minute resolution this long,
+# then as hourly averages, then as daily averages. Rows are rolled up by
+# 'manage.py downsample_weather', which should be scheduled.
+WEATHER_MINUTE_RETENTION_HOURS = 48
+WEATHER_HOURLY_RETENTION_DAYS = 90
+
+# Bulk write responses are replayed for a repeated Idempotency-Key this long
+IDEMPOTENCY_KEY_HOURS = 24
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Chart and map data are cached with per-model versions (fire/cache.py).
+# "locmem" is per process; use "file" or "redis" (any Redis-compatible
+# server, e.g. a local redis-server or valkey) when running several workers.
+
+FIRE_CACHE_BACKEND = os.environ.get("FIRE_CACHE_BACKEND", "locmem")
+
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fire",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("FIRE_CACHE_LOCATION", BASE_DIR / ".cache"),
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("FIRE_CACHE_LOCATION", "redis://127.0.0.1:6379"),
+    },
+}
+
+CACHES = {
+    "default": CACHE_BACKENDS[FIRE_CACHE_BACKEND],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
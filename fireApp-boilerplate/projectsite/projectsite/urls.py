@@ -1,9 +1,15 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 
-from fire.views import HomePageView, ChartView, PieCountbySeverity, LineCountbyMonth, MultilineIncidentTop3Country, multipleBarbySeverity
+from fire.views import HomePageView, ChartView
 from fire import views
 
+if settings.FIRE_ASYNC_VIEWS:
+    from fire import async_views as data_views
+else:
+    data_views = views
+
 
 from fire.views import LocationsCreateView, LocationsUpdateView, LocationsDeleteView, LocationsListView 
 from fire.views import IncidentCreateView, IncidentUpdateView, IncidentDeleteView, IncidentListView
@@ -29,15 +35,33 @@ from fire.views import (
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     path('', HomePageView.as_view(), name='home'),
     path('dashboard_chart', ChartView.as_view(), name='dashboard-charts'),
-    path('chart/', PieCountbySeverity, name='charts'),
-    path('lineChart/', LineCountbyMonth, name='chart'),
-    path('multilineChart/', MultilineIncidentTop3Country, name='chart'),
-    path('multiBarChart/', multipleBarbySeverity, name='chart'),
+    path('chart/', data_views.PieCountbySeverity, name='charts'),
+    path('lineChart/', data_views.LineCountbyMonth, name='line-chart'),
+    path('multilineChart/', data_views.MultilineIncidentTop3Country, name='multiline-chart'),
+    path('multiBarChart/', data_views.multipleBarbySeverity, name='multibar-chart'),
+    path('dashboard/data', data_views.dashboard_data, name='dashboard-data'),
 
-    path('stations', views.map_station, name='map-station'),
-    path('incidents', views.map_incidents, name='map-incidents'),
+    path('stations', data_views.map_station, name='map-station'),
+    path('incidents', data_views.map_incidents, name='map-incidents'),
+    path('api/incidents.geojson', data_views.incidents_geojson, name='incidents-geojson'),
+    path('api/incidents/clusters.json', data_views.incident_clusters, name='incident-clusters'),
+    path('api/incidents/live', data_views.incident_feed, name='incident-feed'),
+    path('api/incidents.csv', views.export_incidents, {'fmt': 'csv'}, name='incidents-export-csv'),
+    path('api/incidents.ndjson', views.export_incidents, {'fmt': 'ndjson'}, name='incidents-export-ndjson'),
+    path('api/sync', views.sync_changes, name='sync-changes'),
+    path('api/sync/<str:model>', views.sync_changes, name='sync-model-changes'),
+    path('api/incidents/search', views.incident_search_api, name='incident-search-api'),
+    path('api/incidents/<int:pk>/weather', views.weather_series, name='incident-weather'),
+    path('api/bulk/<str:model>', views.bulk_write, name='bulk-write'),
+    path('api/weather/readings', views.ingest_weather, name='weather-ingest'),
+    path('api/incidents/<int:pk>/dispatch', views.dispatch_recommendations, name='incident-dispatch-api'),
+    path('api/autocomplete/<str:source>', views.autocomplete_options, name='autocomplete'),
+    path('api/stations.geojson', data_views.stations_geojson, name='stations-geojson'),
+    path('api/stations/nearest', views.nearest_stations, name='stations-nearest'),
+    path('api/stations/within', views.stations_within, name='stations-within'),
 
 
     #CRUD for Locations
@@ -48,9 +72,11 @@ urlpatterns = [
 
     #CRUD for Incidents
     path('incident_list/', IncidentListView.as_view(), name='incident-list'),
+    path('incident_list/search/', views.incident_search, name='incident-search'),
     path('incident_list/add/', IncidentCreateView.as_view(), name='incident-add'),
     path('incident_list/<int:pk>/', IncidentUpdateView.as_view(), name='incident-update'),
     path('incident_list/<int:pk>/delete/', IncidentDeleteView.as_view(), name='incident-delete'),
+    path('incident_list/<int:pk>/dispatch/', views.incident_dispatch, name='incident-dispatch'),
 
     #CRUD for Fire Stations
     path('firestations/', FireStationListView.as_view(), name='firestation-list'),
@@ -0,0 +1,76 @@
+"use strict";
+// Foreign key autocomplete for the <select data-autocomplete="..."> fields
+// rendered by fire.forms.AutocompleteSelect. The select only holds the
+// current choice; typing in the search box above it fetches matching
+// options from the autocomplete API and puts them in the select.
+(function () {
+  var DELAY_MS = 250;
+
+  function setOptions(select, results, more) {
+    var selected = select.options[select.selectedIndex];
+    var keep = selected && selected.value ? selected.cloneNode(true) : null;
+    select.innerHTML = "";
+    select.appendChild(new Option("---------", ""));
+    if (keep) {
+      select.appendChild(keep);
+    }
+    results.forEach(function (result) {
+      if (!keep || String(result.id) !== keep.value) {
+        select.appendChild(new Option(result.text, result.id));
+      }
+    });
+    if (more) {
+      var hint = new Option("Keep typing to narrow the results ...", "");
+      hint.disabled = true;
+      select.appendChild(hint);
+    }
+    if (keep) {
+      select.value = keep.value;
+    }
+  }
+
+  function attach(select) {
+    var input = document.createElement("input");
+    input.type = "search";
+    input.className = "form-control mb-1";
+    input.placeholder = "Type to search ...";
+    input.setAttribute("aria-label", "Search " + (select.name || "options"));
+    select.parentNode.insertBefore(input, select);
+
+    var timer = null;
+    var request = null;
+    function load() {
+      if (request) {
+        request.abort();
+      }
+      request = new AbortController();
+      var params = new URLSearchParams({ q: input.value });
+      fetch(select.dataset.autocomplete + "?" + params.toString(), { signal: request.signal })
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          setOptions(select, data.results || [], data.more);
+          if (input.value && data.results && data.results.length && !select.value) {
+            select.value = String(data.results[0].id);
+          }
+        })
+        .catch(function (error) {
+          if (error.name !== "AbortError") {
+            console.error("Autocomplete failed:", error);
+          }
+        });
+    }
+
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      timer = setTimeout(load, DELAY_MS);
+    });
+    // The first options are fetched when the field is first used
+    select.addEventListener("focus", function () {
+      if (select.options.length <= 2) {
+        load();
+      }
+    }, { once: true });
+  }
+
+  document.querySelectorAll("select[data-autocomplete]").forEach(attach);
+})();